@@ -1,6 +1,17 @@
+import argparse
+import bz2
+import glob
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import lzma
+import mmap
+import os
 import re
-import sys
 from collections import Counter
+from multiprocessing import Pool
 
 # composers
 
@@ -8,57 +19,103 @@ def get_composer(raw_name):
     return raw_name.split("(")[0].strip()
 
 
-def count_composers():
-    counter = Counter()
+def composer_names(parsed_names):
+    if not parsed_names or parsed_names.strip() == "":
+        return
+    if "&" in parsed_names:
+        separator = "&"
+    elif "r/F" in parsed_names:
+        separator = "/"
+    else:
+        separator = ";"
+    for parsed_name in parsed_names.split(separator):
+        yield get_composer(parsed_name)
 
-    with open(path, "r") as file:
-        composer_pattern = re.compile("(Composer: )(.*)")
 
-        for line in file:
-            parsed_names = parse_line(composer_pattern, line)
-            if not parsed_names or parsed_names.strip() == "":
-                continue
-            if "&" in parsed_names:
-                for parsed_name in parsed_names.split("&"):
-                    name = get_composer(parsed_name)
-                    counter[name] += 1
-            elif "r/F" in parsed_names:
-                for parsed_name in parsed_names.split("/"):
-                    name = get_composer(parsed_name)
-                    counter[name] += 1
-            else:
-                for parsed_name in parsed_names.split(";"):
-                    name = get_composer(parsed_name)
-                    counter[name] += 1
-
-    return counter
+def add_composers(counter, parsed_names):
+    counter.update(composer_names(parsed_names))
+
+
+def count_composers():
+    return count_lines(catalog_lines(), ["composer"])["composer"]
 
 
 def print_composers_counts(composers):
     for name, count in composers.most_common():
         print("%s: %d" % (name, count))
 
-# composed centuries
 
-def count_comosation_centurie():
-    counter = Counter()
+class SpaceSaving(object):
+    """
+    Approximate counter of heavy hitters (Space-Saving algorithm) tracking at most `capacity` items.
+    Reported count of an item is never lower than its true count and exceeds it by at most its error.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.heap = []
 
-    with open(path, "r") as file:
-        composation_pattern = re.compile("(Composition Year: )(.*)")
+    def update(self, items):
+        for item in items:
+            self.add(item)
 
-        for line in file:
-            parsed_year_or_century = parse_line(composation_pattern, line)
-            if not parsed_year_or_century or parsed_year_or_century.strip() == "":
-                continue
-            if "century" in parsed_year_or_century:
-                century = int(parsed_year_or_century.split("th")[0])
-            else:
-                year_pattern = re.compile(r"(\d{4})")
-                year = search_line(year_pattern, parsed_year_or_century)
-                century = int(str(int(year)-1)[:2])+1
-            counter[century] += 1
+    def add(self, item):
+        if item in self.counts:
+            self.counts[item] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = 1
+            self.errors[item] = 0
+            heapq.heappush(self.heap, (1, item))
+        else:
+            minimum = self._evict_min()
+            self.counts[item] = minimum + 1
+            self.errors[item] = minimum
+            heapq.heappush(self.heap, (minimum + 1, item))
+
+    def _evict_min(self):
+        # heap entries are not updated on increments, stale ones are pushed back with current count
+        while True:
+            count, item = heapq.heappop(self.heap)
+            if self.counts[item] == count:
+                del self.counts[item]
+                del self.errors[item]
+                return count
+            heapq.heappush(self.heap, (self.counts[item], item))
+
+    def most_common(self, k):
+        """
+        :return: list of (item, count, error) for k items with highest counts
+        """
+        top = heapq.nlargest(k, self.counts.items(), key=lambda item_count: item_count[1])
+        return [(item, count, self.errors[item]) for item, count in top]
+
+
+def count_composers_topk(top, capacity):
+    stats = new_stats()
+    stats["composer"] = SpaceSaving(capacity)
+    return count_lines(catalog_lines(), ["composer"], stats)["composer"].most_common(top)
 
-    return counter
+
+def print_composers_topk(composers):
+    for name, count, error in composers:
+        print("%s: %d (error <= %d)" % (name, count, error))
+
+# composed centuries
+
+def add_century(counter, parsed_year_or_century):
+    if not parsed_year_or_century or parsed_year_or_century.strip() == "":
+        return
+    if "century" in parsed_year_or_century:
+        century = int(parsed_year_or_century.split("th")[0])
+    else:
+        year = search_line(YEAR_PATTERN, parsed_year_or_century)
+        century = int(str(int(year)-1)[:2])+1
+    counter[century] += 1
+
+
+def count_comosation_centurie():
+    return count_lines(catalog_lines(), ["century"])["century"]
 
 
 def print_centuries(composed_at):
@@ -66,15 +123,324 @@ def print_centuries(composed_at):
         print("%dth century: %d" % (name, count))
 
 
-def count_c_minor():
+def count_c_minor(fields_only=False):
     """
     Info about c minor key is under Key or in Title, but never in both.
-    Stupid simple solution.
-    :return:
+    File is memory-mapped and scanned by a bytes regex in line-aligned chunks,
+    so memory does not grow with catalog size and no match is cut by a chunk border.
+    Compressed files are scanned the same way in decompressed line-aligned blocks.
+    :param fields_only: count only occurrences inside Key: and Title: fields
+    :return: number of "c minor" occurrences
+    """
+    count = 0
+    for file_path in paths:
+        opener = compression_opener(file_path)
+        if opener:
+            with opener(file_path, "rb") as file:
+                count += sum(count_c_minor_in_range(block, 0, len(block), fields_only) for block in read_blocks(file))
+            continue
+
+        with open(file_path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                continue
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                count += sum(count_c_minor_in_range(mm, start, end, fields_only) for start, end in chunk_ranges(mm))
+    return count
+
+
+def count_c_minor_in_range(buffer, start, end, fields_only=False):
+    if not fields_only:
+        return sum(1 for _ in CMINOR_PATTERN.finditer(buffer, start, end))
+
+    count = 0
+    for field in CMINOR_FIELDS_PATTERN.finditer(buffer, start, end):
+        count += sum(1 for _ in CMINOR_PATTERN.finditer(buffer, field.start(), field.end()))
+    return count
+
+
+def chunk_ranges(buffer, chunk_size=None):
+    """
+    Split buffer into (start, end) ranges of about chunk_size bytes, each ending after a newline.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    start, size = 0, len(buffer)
+    while start < size:
+        end = buffer.find(b"\n", start + chunk_size)
+        end = size if end == -1 else end + 1
+        yield start, end
+        start = end
+
+# all modes in one pass
+
+def new_stats():
+    return {"composer": Counter(), "century": Counter(), "cminor": 0}
+
+
+def count_lines(lines, modes, stats=None):
+    """
+    Scan catalog lines once and feed every line only to accumulators of requested modes.
+    Field lines are dispatched by their label (text before ": "), so each line
+    is split once instead of being matched against every pattern.
+    :param stats: accumulators to fill, new_stats() by default
+    :return: dict with "composer" and "century" Counters and "cminor" count
+    """
+    stats = stats or new_stats()
+    handlers = {label: handler for label, (mode, handler) in LINE_HANDLERS.items() if mode in modes}
+    count_cminor = "cminor" in modes
+
+    for line in lines:
+        if count_cminor:
+            stats["cminor"] += line.count("c minor")
+        label, separator, value = line.partition(": ")
+        if separator and label in handlers:
+            handlers[label](stats[LINE_HANDLERS[label][0]], value.split("\n")[0])
+
+    return stats
+
+
+def count_all():
+    return count_lines(catalog_lines(), MODES)
+
+
+def print_stats(stats, modes):
+    if "composer" in modes:
+        print_composers_counts(stats["composer"])
+    if "century" in modes:
+        print_centuries(stats["century"])
+    if "cminor" in modes:
+        print("%d compositions in c minor key" % stats["cminor"])
+
+
+def print_all(stats):
+    print_stats(stats, MODES)
+
+
+def read_blocks(file, start=0, end=None):
+    """
+    Read binary file between byte offsets start and end in blocks of about CHUNK_SIZE bytes.
+    Every block but the last one ends with a newline.
+    """
+    file.seek(start)
+    remaining = end - start if end is not None else None
+    tail = b""
+    while remaining is None or remaining > 0:
+        block = file.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+        if not block:
+            break
+        if remaining is not None:
+            remaining -= len(block)
+        block = tail + block
+        cut = block.rfind(b"\n") + 1
+        tail = block[cut:]
+        if cut:
+            yield block[:cut]
+    if tail:
+        yield tail
+
+
+def read_lines(file, start=0, end=None):
+    """
+    Read text lines from binary file between byte offsets start and end.
+    Lines are decoded block by block with the same newline handling as open(path, "r").
+    """
+    for block in read_blocks(file, start, end):
+        yield from io.StringIO(block.decode("utf-8"), newline=None)
+
+
+def catalog_lines():
+    """
+    Lines of all library files one after another, compressed files are decompressed on the fly.
+    """
+    for file_path in paths:
+        opener = compression_opener(file_path)
+        if opener:
+            with opener(file_path, "rb") as file:
+                yield from read_lines(file)
+        else:
+            with open(file_path, "r") as file:
+                yield from file
+
+
+def merge_stats(stats, other):
+    """
+    Merge other into stats. Counters are merged in call order, so merging
+    parts in file order keeps first-occurrence order of equal counts.
+    """
+    stats["composer"].update(other["composer"])
+    stats["century"].update(other["century"])
+    stats["cminor"] += other["cminor"]
+    return stats
+
+# parallel execution
+
+def record_ranges(file_path, parts, start=0, end=None):
+    """
+    Split file between byte offsets start and end into at most `parts` byte ranges of similar size.
+    Every range except the first starts on a "Print Number:" line, so no record is split.
+    """
+    with open(file_path, "rb") as file:
+        if end is None:
+            end = os.fstat(file.fileno()).st_size
+        if end <= start:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            boundaries = [start]
+            for part in range(1, parts):
+                position = mm.find(b"\nPrint Number:", max(start + (end - start) * part // parts - 1, boundaries[-1]), end)
+                if position == -1:
+                    break
+                boundaries.append(position + 1)
+    boundaries.append(end)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def catalog_ranges(parts):
+    """
+    :return: (file path, start, end) ranges of all library files, compressed files are never split
+    """
+    ranges = []
+    for file_path in paths:
+        if compression_opener(file_path):
+            ranges.append((file_path, 0, None))
+        else:
+            ranges.extend((file_path, start, end) for start, end in record_ranges(file_path, parts))
+    return ranges
+
+
+def count_range(task):
+    file_path, start, end, modes, fields_only = task
+    opener = compression_opener(file_path) or open
+    with opener(file_path, "rb") as file:
+        if modes != ["cminor"]:
+            return count_lines(read_lines(file, start, end), modes)
+
+        stats = new_stats()
+        if opener is not open:
+            stats["cminor"] = sum(count_c_minor_in_range(block, 0, len(block), fields_only)
+                                  for block in read_blocks(file))
+        else:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                stats["cminor"] = count_c_minor_in_range(mm, start, end, fields_only)
+        return stats
+
+
+def count_parallel(modes, jobs, fields_only=False, ranges=None):
+    """
+    Count requested modes in `jobs` worker processes, each over its own record-aligned byte range.
+    Partial results are merged in file order, so the output matches a single process run.
+    :param ranges: (file path, start, end) ranges to count, all library files by default
+    """
+    ranges = ranges if ranges is not None else catalog_ranges(jobs)
+    tasks = [(file_path, start, end, modes, fields_only) for file_path, start, end in ranges]
+    stats = new_stats()
+    with Pool(jobs) as pool:
+        for part in pool.map(count_range, tasks):
+            merge_stats(stats, part)
+    return stats
+
+# checkpoints
+
+def prefix_fingerprint(file, offset):
+    """
+    Fingerprint of first `offset` bytes of file made from its length, first and last block.
+    Catalog is expected to only grow by appending, so this is enough to notice a rewrite or truncation.
+    """
+    digest = hashlib.sha256(str(offset).encode())
+    file.seek(0)
+    digest.update(file.read(min(offset, FINGERPRINT_BLOCK)))
+    tail_start = max(0, offset - FINGERPRINT_BLOCK)
+    file.seek(tail_start)
+    digest.update(file.read(offset - tail_start))
+    return digest.hexdigest()
+
+
+def load_checkpoint(checkpoint_path, file):
+    """
+    :return: (stats, offset) stored in checkpoint, or empty stats and offset 0
+        when the checkpoint is missing, broken or does not match the file prefix
+    """
+    try:
+        with open(checkpoint_path, "r") as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        offset = checkpoint["offset"]
+        if offset > os.fstat(file.fileno()).st_size or prefix_fingerprint(file, offset) != checkpoint["fingerprint"]:
+            return new_stats(), 0
+        stats = {
+            "composer": Counter(dict(checkpoint["composer"])),
+            "century": Counter({int(century): count for century, count in checkpoint["century"]}),
+            "cminor": checkpoint["cminor"],
+        }
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        return new_stats(), 0
+    return stats, offset
+
+
+def save_checkpoint(checkpoint_path, file, stats, offset):
+    checkpoint = {
+        "offset": offset,
+        "fingerprint": prefix_fingerprint(file, offset),
+        "composer": list(stats["composer"].items()),
+        "century": list(stats["century"].items()),
+        "cminor": stats["cminor"],
+    }
+    with open(checkpoint_path + ".tmp", "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file, ensure_ascii=False)
+    os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+
+def complete_lines_end(file, start):
+    """
+    :return: offset just after the last newline behind start, or start if there is none
+    """
+    size = os.fstat(file.fileno()).st_size
+    if size <= start:
+        return start
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm.rfind(b"\n", start) + 1 or start
+
+
+def count_incremental(checkpoint_path, jobs=1):
+    """
+    Count all modes scanning only the part of the catalog appended since the last checkpoint.
+    Checkpoint is advanced to the last complete line; a trailing unfinished line is counted
+    in the result but scanned again next time.
+    """
+    with open(path, "rb") as file:
+        stats, offset = load_checkpoint(checkpoint_path, file)
+        end = complete_lines_end(file, offset)
+
+        if jobs > 1:
+            ranges = [(path, start, range_end) for start, range_end in record_ranges(path, jobs, offset, end)]
+            merge_stats(stats, count_parallel(MODES, jobs, ranges=ranges))
+        else:
+            merge_stats(stats, count_lines(read_lines(file, offset, end), MODES))
+        save_checkpoint(checkpoint_path, file, stats, end)
+
+        return merge_stats(stats, count_lines(read_lines(file, end), MODES))
+
+# input files
+
+def expand_paths(patterns):
+    """
+    Expand glob patterns, a pattern matching nothing is kept as it is.
     """
-    with open(path, "r") as file:
-        all_occurences = re.findall("c minor", file.read())
-        return len(all_occurences)
+    file_paths = []
+    for pattern in patterns:
+        file_paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    return file_paths
+
+
+def compression_opener(file_path):
+    """
+    Detect compressed file by its magic bytes.
+    :return: open function of matching compression module, None for plain text file
+    """
+    with open(file_path, "rb") as file:
+        magic = file.read(6)
+    for signature, opener in COMPRESSION_OPENERS:
+        if magic.startswith(signature):
+            return opener
+
 
 # parsers
 def parse_line(pattern, line):
@@ -89,23 +455,74 @@ def search_line(pattern, line):
         return found.group(1)
 
 
+YEAR_PATTERN = re.compile(r"(\d{4})")
+
+CMINOR_PATTERN = re.compile(b"c minor")
+
+CMINOR_FIELDS_PATTERN = re.compile(rb"^(?:Key|Title): [^\n]*", re.MULTILINE)
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+FINGERPRINT_BLOCK = 64 * 1024
+
+COMPRESSION_OPENERS = [
+    (b"\x1f\x8b", gzip.open),
+    (b"BZh", bz2.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+]
+
+MODES = ["composer", "century", "cminor"]
+
+LINE_HANDLERS = {
+    "Composer": ("composer", add_composers),
+    "Composition Year": ("century", add_century),
+}
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        sys.exit("First argument should be path to library, second argument should be mode [composer, century, cminor]")
+    parser = argparse.ArgumentParser(description="Statistics over score library catalog.")
+    parser.add_argument("path", nargs="+", help="paths or glob patterns of library files, may be gzip, bz2 or xz compressed")
+    parser.add_argument("mode", help="mode [composer, century, cminor, all, composer-topk]")
+    parser.add_argument("--fields", action="store_true",
+                        help="cminor mode counts only occurrences in Key: and Title: fields")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--checkpoint", help="checkpoint file, only text appended since last run is scanned")
+    parser.add_argument("--top", type=int, default=10, help="number of composers printed by composer-topk")
+    parser.add_argument("--counters", type=int, default=1000,
+                        help="memory budget of composer-topk as number of tracked composer names")
+    args = parser.parse_args()
+    if args.checkpoint and args.fields:
+        parser.error("--fields can not be combined with --checkpoint")
+    if args.mode == "composer-topk" and (args.checkpoint or args.jobs > 1):
+        parser.error("composer-topk can not be combined with --checkpoint or --jobs")
+    if args.counters < args.top:
+        parser.error("--counters must be at least --top")
 
-    path = sys.argv[1]
+    paths = expand_paths(args.path)
+    path = paths[0]
+    modes = MODES if args.mode == "all" else [args.mode]
 
     try:
-        if sys.argv[2] == "composer":
+        if args.mode == "composer-topk":
+            print_composers_topk(count_composers_topk(args.top, args.counters))
+        elif args.mode not in MODES + ["all"]:
+            print("Unknown mode, choose one from [composer, century, cminor, all, composer-topk]")
+        elif args.checkpoint and (len(paths) > 1 or compression_opener(path)):
+            print("Checkpoint works only with a single uncompressed library file")
+        elif args.checkpoint:
+            print_stats(count_incremental(args.checkpoint, args.jobs), modes)
+        elif args.jobs > 1:
+            print_stats(count_parallel(modes, args.jobs, args.fields), modes)
+        elif args.mode == "composer":
             counted_composers = count_composers()
             print_composers_counts(counted_composers)
-        elif sys.argv[2] == "century":
+        elif args.mode == "century":
             composation_centuries = count_comosation_centurie()
             print_centuries(composation_centuries)
-        elif sys.argv[2] == "cminor":
-            cminor_count = count_c_minor()
+        elif args.mode == "cminor":
+            cminor_count = count_c_minor(args.fields)
             print("%d compositions in c minor key" % cminor_count)
-        else:
-            print("Unknown mode, choose one from [composer, century, cminor]")
+        elif args.mode == "all":
+            print_all(count_all())
     except FileNotFoundError:
         print("Bad path to file")
@@ -0,0 +1,381 @@
+import heapq
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+
+from scorelib import Composer, Composition, Edition, Editor, Print, Voice, iter_load
+
+
+class StringColumn(object):
+    """
+    Dictionary-encoded column, every row stores only integer code of its value.
+    None is always encoded as 0.
+    """
+    def __init__(self):
+        self.values = [None]
+        self.codes_by_value = {None: 0}
+        self.codes = array("l")
+
+    def encode(self, value):
+        code = self.codes_by_value.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes_by_value[value] = code
+        return code
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def row_codes(self):
+        """
+        :return: iterable of (row, code) pairs
+        """
+        return enumerate(self.codes)
+
+
+class ListColumn(StringColumn):
+    """
+    Dictionary-encoded many-valued column, codes of row i are codes[offsets[i]:offsets[i + 1]].
+    """
+    def __init__(self):
+        StringColumn.__init__(self)
+        self.offsets = array("l", [0])
+
+    def append(self, values):
+        self.codes.extend(self.encode(value) for value in values)
+        self.offsets.append(len(self.codes))
+
+    def __getitem__(self, row):
+        return [self.values[code] for code in self.codes[self.offsets[row]:self.offsets[row + 1]]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def row_codes(self):
+        for row in range(len(self)):
+            # the same value twice in one row belongs to the row only once
+            for code in set(self.codes[self.offsets[row]:self.offsets[row + 1]]):
+                yield row, code
+
+
+class Catalog(object):
+    """
+    Column-oriented catalog of prints. Integer fields are kept in arrays, text fields
+    in dictionary-encoded columns, so a print takes a few integers instead of seven objects.
+    Missing years, born and died are stored as 0, missing partiture as -1.
+    """
+    def __init__(self):
+        self.print_ids = array("l")
+        self.years = array("l")
+        self.partitures = array("b")
+        self.columns = {
+            "title": StringColumn(),
+            "genre": StringColumn(),
+            "key": StringColumn(),
+            "incipit": StringColumn(),
+            "edition": StringColumn(),
+            "composer": ListColumn(),
+            "editor": ListColumn(),
+            "voice_range": ListColumn(),
+            "voice_name": ListColumn(),
+        }
+        # aligned with codes of composer column
+        self.composer_born = array("l")
+        self.composer_died = array("l")
+
+    @classmethod
+    def from_prints(cls, prints):
+        catalog = cls()
+        for p in prints:
+            catalog.append(p)
+        return catalog
+
+    def __len__(self):
+        return len(self.print_ids)
+
+    def append(self, p):
+        composition = p.edition.composition
+        self.print_ids.append(p.print_id)
+        self.years.append(int(composition.year) if composition.year else 0)
+        self.partitures.append(-1 if p.partiture is None else int(p.partiture))
+        self.columns["title"].append(composition.name)
+        self.columns["genre"].append(composition.genre)
+        self.columns["key"].append(composition.key)
+        self.columns["incipit"].append(composition.incipit)
+        self.columns["edition"].append(p.edition.name)
+        self.columns["composer"].append([composer.name for composer in composition.authors])
+        self.composer_born.extend(composer.born or 0 for composer in composition.authors)
+        self.composer_died.extend(composer.died or 0 for composer in composition.authors)
+        self.columns["editor"].append([editor.name for editor in p.edition.authors])
+        self.columns["voice_range"].append([voice.range for voice in composition.voices])
+        self.columns["voice_name"].append([voice.name for voice in composition.voices])
+
+    def count_by(self, field):
+        """
+        :param field: "year" or name of a column, e.g. "genre", "key", "composer" or "editor"
+        :return: Counter of values, every value of a many-valued field is counted
+        """
+        if field == "year":
+            return Counter({year or None: count for year, count in Counter(self.years).items()})
+        column = self.columns[field]
+        return Counter({column.values[code]: count for code, count in Counter(column.codes).items()})
+
+    def group_by(self, field):
+        """
+        :param field: "year" or name of a column
+        :return: dict of value to list of rows with that value
+        """
+        groups = defaultdict(list)
+        if field == "year":
+            for row, year in enumerate(self.years):
+                groups[year or None].append(row)
+            return dict(groups)
+
+        column = self.columns[field]
+        for row, code in column.row_codes():
+            groups[code].append(row)
+        return {column.values[code]: rows for code, rows in groups.items()}
+
+    def row(self, row):
+        """
+        :return: Print object rebuilt from the row
+        """
+        composer_start = self.columns["composer"].offsets[row]
+        composers = [
+            Composer(name, self.composer_born[composer_start + i] or None, self.composer_died[composer_start + i] or None)
+            for i, name in enumerate(self.columns["composer"][row])
+        ]
+        voices = [
+            Voice(name, voice_range)
+            for voice_range, name in zip(self.columns["voice_range"][row], self.columns["voice_name"][row])
+        ]
+        composition = Composition(
+            name=self.columns["title"][row],
+            incipit=self.columns["incipit"][row],
+            key=self.columns["key"][row],
+            genre=self.columns["genre"][row],
+            year=str(self.years[row]) if self.years[row] else None,
+            voices=voices,
+            authors=composers,
+        )
+        edition = Edition(
+            composition,
+            authors=[Editor(name) for name in self.columns["editor"][row]],
+            name=self.columns["edition"][row],
+        )
+        partiture = None if self.partitures[row] == -1 else bool(self.partitures[row])
+        return Print(self.print_ids[row], edition, partiture)
+
+
+class CatalogIndex(object):
+    """
+    Secondary indexes over loaded Print objects: hash indexes from composer and editor name,
+    genre and key to sorted posting lists of rows, and sorted index of composition years.
+    """
+    def __init__(self, prints):
+        self.prints = list(prints)
+        self.postings = {field: defaultdict(list) for field in ("composer", "editor", "genre", "key")}
+        dated_rows = []
+
+        for row, p in enumerate(self.prints):
+            composition = p.edition.composition
+            for name in dict.fromkeys(composer.name for composer in composition.authors):
+                self.postings["composer"][name].append(row)
+            for name in dict.fromkeys(editor.name for editor in p.edition.authors):
+                self.postings["editor"][name].append(row)
+            if composition.genre:
+                self.postings["genre"][composition.genre].append(row)
+            if composition.key:
+                self.postings["key"][composition.key].append(row)
+            if composition.year:
+                dated_rows.append((int(composition.year), row))
+
+        dated_rows.sort()
+        self.years = [year for year, row in dated_rows]
+        self.year_rows = [row for year, row in dated_rows]
+
+    def lookup(self, field, value):
+        """
+        :param field: "composer", "editor", "genre" or "key"
+        :return: sorted rows with the exact value
+        """
+        return self.postings[field].get(value, [])
+
+    def year_range(self, year_from=None, year_to=None):
+        """
+        :return: sorted rows composed between year_from and year_to, both inclusive
+        """
+        start = bisect_left(self.years, year_from) if year_from is not None else 0
+        end = bisect_right(self.years, year_to) if year_to is not None else len(self.years)
+        return sorted(self.year_rows[start:end])
+
+    def query(self, composer=None, editor=None, genre=None, key=None, year_from=None, year_to=None):
+        """
+        Conjunctive query, posting lists of all given conditions are intersected from the shortest one.
+        :return: matching prints in load order
+        """
+        conditions = {"composer": composer, "editor": editor, "genre": genre, "key": key}
+        postings = [self.lookup(field, value) for field, value in conditions.items() if value is not None]
+        if year_from is not None or year_to is not None:
+            postings.append(self.year_range(year_from, year_to))
+        if not postings:
+            return list(self.prints)
+
+        postings.sort(key=len)
+        rows = set(postings[0])
+        for posting in postings[1:]:
+            if not rows:
+                break
+            rows.intersection_update(posting)
+        return [self.prints[row] for row in sorted(rows)]
+
+
+def incipit_tokens(incipit):
+    """
+    :return: lowercase notation tokens of incipit without bar lines, e.g. ["treble", "2/4", "c4", "d8", "e8"]
+    """
+    return [token for token in incipit.lower().split() if token != "|"]
+
+
+def incipit_ngrams(incipit, n):
+    """
+    :return: set of n-grams of incipit tokens, incipit shorter than n is one gram
+    """
+    tokens = incipit_tokens(incipit)
+    if len(tokens) <= n:
+        return {tuple(tokens)} if tokens else set()
+    return {tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1)}
+
+
+class IncipitIndex(object):
+    """
+    Inverted index from token n-grams of incipits to posting arrays of incipits containing them.
+    Equal incipits are indexed once and keep list of their keys (print or score ids),
+    so a big catalog costs only as much as its distinct incipits.
+    """
+    def __init__(self, n=3):
+        self.n = n
+        self.gram_ids = {}
+        self.postings = []
+        self.incipit_ids = {}
+        self.incipits = []
+        self.keys = []
+        self.sizes = array("l")
+        self.norms = None
+
+    @classmethod
+    def from_prints(cls, prints, n=3):
+        """
+        Index incipits of loaded prints, keys are print ids.
+        """
+        index = cls(n)
+        for p in prints:
+            index.add(p.print_id, p.edition.composition.incipit)
+        return index
+
+    @classmethod
+    def from_db(cls, db_conn, n=3):
+        """
+        Index score.incipit column of SQLite database, keys are score ids.
+        """
+        index = cls(n)
+        for score_id, incipit in db_conn.execute("SELECT id, incipit FROM score WHERE incipit IS NOT NULL;"):
+            index.add(score_id, incipit)
+        return index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, incipit):
+        if not incipit:
+            return
+        incipit_id = self.incipit_ids.get(incipit)
+        if incipit_id is not None:
+            self.keys[incipit_id].append(key)
+            return
+
+        grams = incipit_ngrams(incipit, self.n)
+        if not grams:
+            return
+        incipit_id = self.incipit_ids[incipit] = len(self.keys)
+        self.incipits.append(incipit)
+        self.keys.append([key])
+        self.sizes.append(len(grams))
+        self.norms = None
+        for gram in grams:
+            gram_id = self.gram_ids.get(gram)
+            if gram_id is None:
+                gram_id = self.gram_ids[gram] = len(self.postings)
+                self.postings.append(array("l"))
+            self.postings[gram_id].append(incipit_id)
+
+    def idf(self, gram_id):
+        return math.log(1 + len(self.keys) / len(self.postings[gram_id]))
+
+    def similar(self, incipit, k=10, measure="jaccard"):
+        """
+        Top k indexed incipits most similar to the given one. Only incipits sharing at least one gram
+        are scored, by walking posting arrays of query grams.
+        :param measure: "jaccard" of gram sets, or "tfidf" cosine of idf weighted gram sets
+        :return: list of (similarity, incipit, keys) sorted from the most similar
+        """
+        grams = incipit_ngrams(incipit, self.n)
+        gram_ids = [self.gram_ids[gram] for gram in grams if gram in self.gram_ids]
+        query_size = len(grams)
+        scores = Counter()
+
+        if measure == "jaccard":
+            for gram_id in gram_ids:
+                scores.update(self.postings[gram_id])
+            similarities = (
+                (shared / (query_size + self.sizes[incipit_id] - shared), incipit_id)
+                for incipit_id, shared in scores.items()
+            )
+        elif measure == "tfidf":
+            norms = self.tfidf_norms()
+            query_norm = 0.0
+            for gram_id in gram_ids:
+                weight = self.idf(gram_id) ** 2
+                query_norm += weight
+                for incipit_id in self.postings[gram_id]:
+                    scores[incipit_id] += weight
+            # grams unknown to the index make the query longer, weighted like the rarest gram
+            query_norm += (query_size - len(gram_ids)) * math.log(1 + len(self.keys)) ** 2
+            similarities = (
+                (score / math.sqrt(query_norm) / norms[incipit_id], incipit_id)
+                for incipit_id, score in scores.items()
+            )
+        else:
+            raise ValueError("Unknown similarity measure %r" % measure)
+
+        # equal similarity is ordered by first occurrence
+        top = heapq.nlargest(k, similarities, key=lambda item: (item[0], -item[1]))
+        return [(similarity, self.incipits[incipit_id], self.keys[incipit_id]) for similarity, incipit_id in top]
+
+    def tfidf_norms(self):
+        """
+        :return: array of idf vector norms of indexed incipits, cached until the next add
+        """
+        if self.norms is None:
+            squares = array("d", bytes(8 * len(self.keys)))
+            for gram_id, posting in enumerate(self.postings):
+                weight = self.idf(gram_id) ** 2
+                for incipit_id in posting:
+                    squares[incipit_id] += weight
+            self.norms = array("d", (math.sqrt(square) for square in squares))
+        return self.norms
+
+
+def load_catalog(file_path):
+    """
+    Load library file straight into Catalog, prints are streamed and never kept as objects.
+    """
+    return Catalog.from_prints(iter_load(file_path))
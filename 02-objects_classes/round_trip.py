@@ -0,0 +1,47 @@
+import io
+import os
+import sys
+
+from scorelib import dump, iter_load, load
+
+
+def print_fields(p):
+    composition = p.edition.composition
+    return (
+        p.print_id, p.partiture, p.edition.name, [editor.name for editor in p.edition.authors],
+        composition.name, composition.genre, composition.key, composition.year, composition.incipit,
+        [(composer.name, composer.born, composer.died) for composer in composition.authors],
+        [(voice.name, voice.range) for voice in composition.voices],
+    )
+
+
+def check_round_trip(prints):
+    """
+    Dump prints, load them back and dump them again.
+    :return: number of prints that load() does not read back equal from dump() output,
+        or that are written differently by the second dump()
+    """
+    buffer = io.StringIO()
+    dump(prints, buffer)
+    text = buffer.getvalue()
+    loaded = list(iter_load(io.StringIO(text)))
+    if len(loaded) != len(prints):
+        return abs(len(loaded) - len(prints))
+    mismatches = sum(1 for p, q in zip(prints, loaded) if print_fields(p) != print_fields(q))
+
+    buffer = io.StringIO()
+    dump(loaded, buffer)
+    if not mismatches and buffer.getvalue() != text:
+        return 1
+    return mismatches
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or [os.path.join(os.path.dirname(os.path.abspath(__file__)), "scorelib.txt")]
+
+    for path in paths:
+        prints = load(path)
+        mismatches = check_round_trip(prints)
+        if mismatches:
+            sys.exit("%s: round trip failed for %d prints!" % (path, mismatches))
+        print("%s: %d prints, round trip ok" % (path, len(prints)))
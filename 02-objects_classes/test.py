@@ -1,17 +1,22 @@
-from scorelib import load
+from scorelib import dump, format_profile, iter_load, profile_load, render_formatted
 import sys
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        sys.exit("First argument should be path to library file!")
+    args = [arg for arg in sys.argv[1:] if arg != "--profile"]
+    profile = len(args) != len(sys.argv) - 1
+    if len(args) != 1:
+        sys.exit("First argument should be path to library file, optional --profile reports parser costs!")
 
-    filename = sys.argv[1]
+    filename = args[0]
 
     try:
-        list_of_prints = load(filename)
-
-        for print_object in list_of_prints:
-            print_object.format()
+        # same text as Print.format() of every print, written in large blocks
+        if profile:
+            with profile_load() as stats:
+                dump(iter_load(filename), sys.stdout, render=render_formatted)
+            print(format_profile(stats), file=sys.stderr)
+        else:
+            dump(iter_load(filename), sys.stdout, render=render_formatted)
 
     except FileNotFoundError:
         print("Bad path to library file")
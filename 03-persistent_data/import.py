@@ -1,9 +1,25 @@
+import argparse
+import os
+import queue
 import sqlite3
 import sys
+import threading
+import time
+from collections import deque
+from multiprocessing import Pool
 from sqlite3 import Error
 import scorelib
 import sql_queries
 
+# bytes of library file parsed by one task of pipelined import
+PIPELINE_CHUNK_SIZE = 256 * 1024
+
+# prints of compressed file sent to the writer at once
+PIPELINE_BATCH = 1000
+
+# parsed chunks waiting for the writer, when the queue is full parsing stops
+PIPELINE_QUEUE_SIZE = 8
+
 
 def init_database(db_file):
     """ create a database connection to a SQLite database """
@@ -30,6 +46,40 @@ def db_connect(db):
     return con
 
 
+def schema_state(db):
+    """
+    :return: "missing" for database without tables, "current" for schema created by init_database,
+        "outdated" for schema without content hash columns
+    """
+    con = db_connect(db)
+    try:
+        tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+        if "print" not in tables:
+            return "missing"
+        for table in ("score", "edition"):
+            if "hash" not in {row[1] for row in con.execute("PRAGMA table_info({0});".format(table))}:
+                return "outdated"
+        return "current"
+    finally:
+        con.close()
+
+
+def existing_print_ids(db_conn):
+    return {row[0] for row in db_conn.execute("SELECT id FROM print;")}
+
+
+def set_bulk_pragmas(db_conn, wal=False, synchronous=None):
+    """
+    Pragmas trading durability of the last transactions for speed of a bulk load.
+    :param wal: use write-ahead log journal, commits append to the log instead of rewriting the database
+    :param synchronous: "OFF", "NORMAL" or "FULL", None keeps the SQLite default
+    """
+    if wal:
+        db_conn.execute("PRAGMA journal_mode=WAL;")
+    if synchronous:
+        db_conn.execute("PRAGMA synchronous={0};".format(synchronous))
+
+
 def test_selects(db):
     tables = ["person", "score", "score_author", "edition", "edition_author", "voice", "print"]
     con = db_connect(db)
@@ -83,73 +133,274 @@ def test_selects(db):
         print("RR: ", result)
 
 
-def check_full_duplicates(db_conn, p):
-    get_sql = """SELECT edition.id, * FROM edition
-      left join score on edition.score = score.id
-      left join voice on score.id = voice.score 
-      left join score_author on score.id = score_author.score
-      left join person on score_author.composer = person.id
-      WHERE ifnull(edition.name, '') = ?
-      AND score.name = ? AND ifnull(score.genre, '') = ? AND ifnull(score.key, '') = ? AND ifnull(score.incipit, '') = ? 
-      AND ifnull(score.year, 0) = ? AND ifnull(voice.range, '') = ? AND ifnull(voice.name, '') = ?
-      AND person.name = ?;"""
-
+def find_edition(db_conn, edition_hash):
+    """
+    Find edition with the same content hash, one lookup in unique index of edition.hash.
+    :return: id of the edition or None
+    """
     cur = db_conn.cursor()
-    cur.execute(get_sql, (
-        p.edition.name if p.edition.name else '',
-        p.edition.composition.name,
-        p.edition.composition.genre if p.edition.composition.genre else '',
-        p.edition.composition.key if p.edition.composition.key else '',
-        p.edition.composition.incipit if p.edition.composition.incipit else '',
-        p.edition.composition.year if p.edition.composition.year else 0,
-        p.edition.composition.voices[0].range if p.edition.composition.voices and p.edition.composition.voices[0].range else '',
-        p.edition.composition.voices[0].name if p.edition.composition.voices and p.edition.composition.voices[0].name else '',
-        p.edition.composition.authors[0].name if p.edition.composition.authors and p.edition.composition.authors[0].name else ''
-    ))
-
-    duplicate = cur.fetchall()
+    cur.execute("SELECT id FROM edition WHERE hash = ?;", (edition_hash,))
+    duplicate = cur.fetchone()
     if duplicate:
-        return duplicate[0][0]  # edition_id
+        return duplicate[0]  # edition_id
     else:
         return None
 
 
-def process_print(db_conn, p):
-    edition_id = check_full_duplicates(db_conn, p)
-    # store authors (person)
-    composers_ids = []
-    for composer in p.edition.composition.authors:
-        composer_id = composer.insert_or_update_to_db(db_conn)
-        composers_ids.append(composer_id)
+def check_full_duplicates(db_conn, p):
+    return find_edition(db_conn, p.edition.content_hash())
+
+
+def print_row(p):
+    """
+    :return: print as plain tuple with content hashes of its score and edition, much cheaper to send
+        between processes than the object graph and written by process_row without rebuilding it
+    """
+    composition = p.edition.composition
+    composers = [(composer.name, composer.born, composer.died) for composer in composition.authors]
+    editors = [(editor.name, editor.born, editor.died) for editor in p.edition.authors]
+    voices = [(voice.range, voice.name) for voice in composition.voices]
+    score_hash = scorelib.score_content_hash(
+        composition.name, composition.genre, composition.key, composition.incipit, composition.year,
+        [composer[0] for composer in composers], voices,
+    )
+    edition_hash = scorelib.edition_content_hash(score_hash, p.edition.name, [editor[0] for editor in editors])
+    return (
+        p.print_id, p.partiture, p.edition.name, edition_hash, editors,
+        score_hash, composition.name, composition.genre, composition.key, composition.incipit, composition.year,
+        composers, voices,
+    )
 
-    editors_ids = []
-    for editor in p.edition.authors:
-        editor_id = editor.insert_or_update_to_db(db_conn)
-        editors_ids.append(editor_id)
+
+def process_row(db_conn, row, person_cache=None):
+    (print_id, partiture, edition_name, edition_hash, editors,
+     score_hash, name, genre, key, incipit, year, composers, voices) = row
+    edition_id = find_edition(db_conn, edition_hash)
+    # store authors (person)
+    composers_ids = [scorelib.upsert_person(db_conn, *composer, cache=person_cache) for composer in composers]
+    editors_ids = [scorelib.upsert_person(db_conn, *editor, cache=person_cache) for editor in editors]
 
     # score + score_author + voice
     if not edition_id:
-        score_id = p.edition.composition.insert_to_db(db_conn, composers_ids)
+        score_id = scorelib.insert_score(db_conn, score_hash, name, genre, key, incipit, year, composers_ids, voices)
         # edition + edition_author
-        edition_id = p.edition.insert_to_db(db_conn, score_id, editors_ids)
+        edition_id = scorelib.insert_edition(db_conn, score_id, edition_name, edition_hash, editors_ids)
     # print
-    p.save_to_db(db_conn, edition_id)
+    scorelib.insert_print(db_conn, print_id, partiture, edition_id)
+
+
+def process_print(db_conn, p, person_cache=None):
+    process_row(db_conn, print_row(p), person_cache)
+
+
+def parse_chunk(chunk):
+    """
+    Worker of pipelined import.
+    :return: (rows of prints of the chunk, seconds spent parsing)
+    """
+    start = time.perf_counter()
+    rows = [print_row(p) for p in scorelib.load_chunk(chunk)]
+    return rows, time.perf_counter() - start
 
 
-def fill_database_with_data(db, data_path):
-    prints = scorelib.load(data_path)
+def catalog_chunks(data_path):
+    """
+    Split library files into chunks of about PIPELINE_CHUNK_SIZE bytes for parse_chunk.
+    Compressed files cannot be split, they are yielded as lists of rows parsed right away.
+    """
+    for path in scorelib.library_paths(data_path):
+        if scorelib.compression_opener(path):
+            rows = []
+            for p in scorelib.iter_load(path):
+                rows.append(print_row(p))
+                if len(rows) == PIPELINE_BATCH:
+                    yield rows
+                    rows = []
+            yield rows
+            continue
+        parts = max(1, os.path.getsize(path) // PIPELINE_CHUNK_SIZE)
+        for start, end in scorelib.record_chunks(path, parts):
+            yield path, start, end
+
+
+def write_rows(db, rows_queue, stats, batch_size, wal, synchronous, append):
+    """
+    The only writer of pipelined import, drains rows_queue until None in transactions of batch_size prints.
+    Any error, also of opening the database or of the last commit, is stored in stats["error"]
+    and the queue is still drained until None, so that producer never blocks on full queue.
+    Producer sets stats["error"] too when it fails, then the last batch is not committed.
+    """
+    db_conn = None
+    finished = False
+    try:
+        db_conn = db_connect(db)
+        set_bulk_pragmas(db_conn, wal, synchronous)
+        skipped_ids = existing_print_ids(db_conn) if append else set()
+        person_cache = {}
+        while True:
+            start = time.perf_counter()
+            rows = rows_queue.get()
+            stats["write_wait_seconds"] += time.perf_counter() - start
+            stats["queue_depth_sum"] += rows_queue.qsize()
+            stats["queue_gets"] += 1
+            if rows is None:
+                finished = True
+                break
+
+            start = time.perf_counter()
+            for row in rows:
+                if row[0] in skipped_ids:
+                    continue
+                process_row(db_conn, row, person_cache)
+                stats["prints"] += 1
+                if stats["prints"] % batch_size == 0:
+                    db_conn.commit()
+            stats["write_seconds"] += time.perf_counter() - start
+
+        if not stats["error"]:
+            db_conn.commit()
+    except Exception as e:
+        stats["error"] = stats["error"] or e
+        while not finished:
+            finished = rows_queue.get() is None
+    finally:
+        if db_conn is not None:
+            db_conn.close()
+
+
+def fill_database_pipelined(db, data_path, workers, batch_size=1, wal=False, synchronous=None, append=False,
+                            queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Import with worker processes parsing chunks into rows and one writer thread storing them in order.
+    At most queue_size parsed chunks wait for the writer and at most `workers` chunks are parsed ahead of them,
+    so memory stays bounded and the writer alone limits throughput.
+    :return: (number of imported prints, dict of stage counters)
+    """
+    stats = {
+        "prints": 0,
+        "chunks": 0,
+        "parse_seconds": 0.0,
+        "write_seconds": 0.0,
+        "write_wait_seconds": 0.0,
+        "queue_depth_sum": 0,
+        "queue_depth_max": 0,
+        "queue_gets": 0,
+        "error": None,
+    }
+    rows_queue = queue.Queue(queue_size)
+    writer = threading.Thread(
+        target=write_rows, args=(db, rows_queue, stats, batch_size, wal, synchronous, append)
+    )
+    writer.start()
+
+    pending = deque()
+
+    def put(rows):
+        # blocks while the queue is full, so no more chunks are given to workers
+        if stats["error"]:
+            raise stats["error"]
+        rows_queue.put(rows)
+        stats["chunks"] += 1
+        stats["queue_depth_max"] = max(stats["queue_depth_max"], rows_queue.qsize())
+
+    def put_parsed():
+        rows, seconds = pending.popleft().get()
+        stats["parse_seconds"] += seconds
+        put(rows)
+
+    start = time.perf_counter()
+    try:
+        with Pool(workers) as pool:
+            for chunk in catalog_chunks(data_path):
+                if isinstance(chunk, list):
+                    # rows of compressed file, parsed here in order with the rest
+                    while pending:
+                        put_parsed()
+                    put(chunk)
+                    continue
+                pending.append(pool.apply_async(parse_chunk, (chunk,)))
+                if len(pending) >= workers:
+                    put_parsed()
+            while pending:
+                put_parsed()
+    except BaseException as e:
+        # writer must not commit rows of an import that failed
+        stats["error"] = stats["error"] or e
+    finally:
+        rows_queue.put(None)
+        writer.join()
+    stats["seconds"] = time.perf_counter() - start
+
+    if stats["error"]:
+        raise stats["error"]
+    return stats["prints"], stats
+
+
+def format_pipeline_stats(stats):
+    return "\n".join([
+        "prints: %d in %d chunks, %.2f s, %.0f prints/s" % (
+            stats["prints"], stats["chunks"], stats["seconds"], stats["prints"] / max(stats["seconds"], 1e-9)),
+        "parse: %.2f s in workers" % stats["parse_seconds"],
+        "write: %.2f s, writer waited for rows %.2f s" % (stats["write_seconds"], stats["write_wait_seconds"]),
+        "queue depth: mean %.1f, max %d" % (
+            stats["queue_depth_sum"] / max(stats["queue_gets"], 1), stats["queue_depth_max"]),
+    ])
+
+
+def fill_database_with_data(db, data_path, batch_size=1, wal=False, synchronous=None, append=False, workers=1):
+    """
+    Import prints in transactions of batch_size prints, every transaction costs one sync of the database file.
+    Committed transactions are checkpoints: after a crash only the last unfinished batch is lost,
+    and import with append continues after the committed prints.
+    :param append: skip prints whose id is already in the database, scores, editions and persons
+        are found by content hash and name, so nothing is stored twice
+    :param workers: number of processes parsing library file for pipelined import, stage counters
+        of the pipeline are printed to standard error
+    :return: number of imported prints
+    """
+    if workers > 1:
+        count, stats = fill_database_pipelined(db, data_path, workers, batch_size, wal, synchronous, append)
+        print(format_pipeline_stats(stats), file=sys.stderr)
+        return count
+
     db_conn = db_connect(db)
-    for p in prints:
-        process_print(db_conn, p)
+    set_bulk_pragmas(db_conn, wal, synchronous)
+    skipped_ids = existing_print_ids(db_conn) if append else set()
+    # valid as long as this import is the only writer of person table
+    person_cache = {}
+    count = 0
+    try:
+        for p in scorelib.iter_load(data_path):
+            if p.print_id in skipped_ids:
+                continue
+            process_print(db_conn, p, person_cache)
+            count += 1
+            if count % batch_size == 0:
+                db_conn.commit()
+        db_conn.commit()
+    finally:
+        db_conn.close()
+    return count
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 3:
-        sys.exit("First argument should be path to library file and second name of database!")
-
-    filename = sys.argv[1]
-    db_path = sys.argv[2]
+    parser = argparse.ArgumentParser(description="Import library file into new SQLite database.")
+    parser.add_argument("path", help="library file")
+    parser.add_argument("db", help="database file to create, or to extend with --append")
+    parser.add_argument("--append", action="store_true",
+                        help="add prints missing in existing database, also resumes interrupted import")
+    parser.add_argument("--batch", type=int, default=1, help="prints imported in one transaction")
+    parser.add_argument("--wal", action="store_true", help="use write-ahead log journal")
+    parser.add_argument("--synchronous", choices=["OFF", "NORMAL", "FULL"], help="synchronous pragma of the import")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes parsing library file while one thread writes the database")
+    args = parser.parse_args()
 
-    init_database(db_path)
-    fill_database_with_data(db_path, filename)
+    state = schema_state(args.db) if args.append else "missing"
+    if state == "outdated":
+        sys.exit("Database has no content hashes of scores and editions, import it again without --append!")
+    if state == "missing":
+        init_database(args.db)
+    fill_database_with_data(args.db, args.path, max(args.batch, 1), args.wal, args.synchronous, args.append,
+                            args.workers)
     # test_selects(db_path)
@@ -1,8 +1,27 @@
+import bz2
+import contextlib
+import functools
+import glob
+import gzip
+import hashlib
+import io
+import locale
+import lzma
+import mmap
+import os
+import pickle
 import re
+import struct
+import sys
+import time
+from collections import defaultdict
+from multiprocessing import Pool
 from sqlite3 import IntegrityError
 
 
 class Person(object):
+    __slots__ = ("name", "born", "died", "type")
+
     def __init__(self, name, born, died, type):
         self.name = name
         self.born = born
@@ -12,82 +31,39 @@ class Person(object):
     def __repr__(self):
         return "{0} ({1}--{2})".format(self.name, self.born, self.died)
 
-    def insert_or_update_to_db(self, db_conn):
-        cur = db_conn.cursor()
-        insert_sql = "INSERT INTO person(name, born, died) VALUES (?, ?, ?);"
-        try:
-            cur.execute(insert_sql, (self.name, self.born, self.died))
-            db_conn.commit()
-            return cur.lastrowid
-        except IntegrityError:
-            cur.execute("SELECT * FROM person WHERE name = ?", (self.name,))
-            person_list = cur.fetchall()
-            if len(person_list) != 1:
-                raise Exception("Integrity broken!")
-            person = person_list[0]
-            new_born = person[1] if person[1] is not None else self.born  # person[1] is born column in DB
-            new_died = person[2] if person[2] is not None else self.died  # person[2] is died column in DB
-            person_id = person[0]
-            cur.execute("UPDATE person SET born = ?, died = ? WHERE id = ?", (new_born, new_died, person_id))
-            db_conn.commit()
-            return person_id
+    def insert_or_update_to_db(self, db_conn, cache=None):
+        return upsert_person(db_conn, self.name, self.born, self.died, cache)
 
 
 class Editor(Person):
+    __slots__ = ()
+
     def __init__(self, name=None, born=None, died=None):
         Person.__init__(self, name, born, died, "editor")
 
+    def __reduce__(self):
+        return Editor, (self.name, self.born, self.died)
+
     def create_from_text(self, text_editor):
-        tmp_name, *rest = text_editor.split("(")
-        self.name = tmp_name.strip().strip("[").strip("]")
-        if self.name.strip() == "":
-            self.name = None
+        self.name = parse_editor_text(text_editor)
 
 
 class Composer(Person):
+    __slots__ = ()
+
     def __init__(self, name=None, born=None, died=None):
         Person.__init__(self, name, born, died, "composer")
 
-    def create_from_text(self, text_composer):
-        text_composer = text_composer.strip()
-        tmp_name, *rest = text_composer.split("(")
-        self.name = tmp_name.strip()
-        if self.name.strip() == "":
-            self.name = None
-
-        # normal range
-        parsed = re.search("(\d\d\d\d--\d\d\d\d)", text_composer)
-        if parsed:
-            b, d = parsed.group().split("--")
-            self.born, self.died = int(b), int(d)
-            return
+    def __reduce__(self):
+        return Composer, (self.name, self.born, self.died)
 
-        # born start with *
-        parsed = re.search("\*\d\d\d\d", text_composer)
-        if parsed:
-            self.born = int(parsed.group()[1:6])
-            return
-
-        # died start with +
-        parsed = re.search("\+\d\d\d\d", text_composer)
-        if parsed:
-            self.died = int(parsed.group()[1:6])
-            return
-
-        parsed = re.search("(--\d\d\d\d)", text_composer)
-        if parsed:
-            b, d = parsed.group().split("--")
-            self.born, self.died = None, int(d)
-            return
-
-        parsed = re.search("(\d\d\d\d--)", text_composer)
-        if parsed:
-            b, d = parsed.group().split("--")
-            self.born, self.died = int(b), None
-            return
+    def create_from_text(self, text_composer):
+        self.name, self.born, self.died = parse_composer_text(text_composer)
 
 
 class Voice(object):
+    __slots__ = ("name", "range")
+
     def __init__(self, name=None, range=None):
         self.name = name
         self.range = range
@@ -95,24 +71,16 @@ class Voice(object):
     def __repr__(self):
         return "{0}, {1}".format(self.range, self.name)
 
+    def __reduce__(self):
+        return Voice, (self.name, self.range)
+
     def create_from_text(self, text_voice):
-        if "--" in text_voice:
-            temp_range, *temp_name = text_voice.split(",", maxsplit=1)
-            if temp_name:
-                self.name = temp_name[0].strip()
-            else:
-                self.name = None
-            self.range = temp_range.strip()
-        else:
-            text_voice = text_voice.strip()
-            if text_voice.startswith("None, "):
-                self.range = None
-                self.name = text_voice.lstrip("None,").strip()
-            else:
-                self.name = text_voice
+        self.name, self.range = parse_voice_text(text_voice)
 
 
 class Composition(object):
+    __slots__ = ("name", "incipit", "key", "genre", "year", "voices", "authors")
+
     def __init__(self, name=None, incipit=None, key=None, genre=None, year=None, voices=None, authors=None):
         self.name = name
         self.incipit = incipit
@@ -122,6 +90,9 @@ class Composition(object):
         self.voices = voices or []
         self.authors = authors or []
 
+    def __reduce__(self):
+        return Composition, (self.name, self.incipit, self.key, self.genre, self.year, self.voices, self.authors)
+
     def set_composers(self, text_value):
         if ";" in text_value:
             composers = [c.strip() for c in text_value.split(";")]
@@ -144,15 +115,15 @@ class Composition(object):
         self.name = text_value
 
     def set_genre(self, text_value):
-        self.genre = text_value
+        self.genre = sys.intern(text_value)
 
     def set_key(self, text_value):
-        self.key = text_value
+        self.key = sys.intern(text_value)
 
     def set_year(self, text_value):
         try:
             if int(text_value) in range(999, 10000):
-                self.year = text_value
+                self.year = sys.intern(text_value)
             else:
                 raise ValueError
         except ValueError:
@@ -166,62 +137,37 @@ class Composition(object):
         voice.create_from_text(text_value)
         self.voices.append(voice)
 
-    def insert_to_db(self, db_conn, composer_ids):
-        cur = db_conn.cursor()
-
-        get_sql = """SELECT * FROM score left join voice on score.id = voice.score 
-          WHERE score.name = ? AND ifnull(genre, '') = ? AND ifnull(key, '') = ? AND ifnull(incipit, '') = ? 
-          AND ifnull(year, 0) = ? AND ifnull(range, '') = ? AND ifnull(voice.name, '') = ?;"""
-        cur.execute(get_sql, (
-            self.name,
-            self.genre if self.genre else '',
-            self.key if self.key else '',
-            self.incipit if self.incipit else '',
-            self.year if self.year else 0,
-            self.voices[0].range if self.voices and self.voices[0].range else '',
-            self.voices[0].name if self.voices and self.voices[0].name else ''
-        ))
-
-        score_voice = cur.fetchall()
-        if score_voice:
-            score_id = score_voice[0][0]
-            return score_id
-
-        try:
-            insert_sql = "INSERT INTO score(name, genre, key, incipit, year) VALUES (?, ?, ?, ?, ?);"
-            cur.execute(insert_sql, (self.name, self.genre, self.key, self.incipit, self.year))
-            db_conn.commit()
-            score_id = cur.lastrowid
-
-            # store relation info into score_author table
-            for composer in composer_ids:
-                cur.execute("INSERT INTO score_author(score, composer) VALUES (?, ?);", (score_id, composer))
-                db_conn.commit()
-
-            # store voices
-            voice_insert_sql = "INSERT INTO voice(number, score, range, name) VALUES (?, ?, ?, ?);"
-            for number, voice in enumerate(self.voices):
-                cur.execute(voice_insert_sql, (number + 1, score_id, voice.range, voice.name))
-                db_conn.commit()
-
-            return score_id
+    def content_hash(self):
+        return score_content_hash(
+            self.name, self.genre, self.key, self.incipit, self.year,
+            [composer.name for composer in self.authors],
+            [(voice.range, voice.name) for voice in self.voices],
+        )
 
-        except IntegrityError:
-            print("INTEGRITY ERROR!")
+    def insert_to_db(self, db_conn, composer_ids):
+        return insert_score(
+            db_conn, self.content_hash(), self.name, self.genre, self.key, self.incipit, self.year,
+            composer_ids, [(voice.range, voice.name) for voice in self.voices],
+        )
 
 
 class Edition(object):
+    __slots__ = ("composition", "authors", "name")
+
     def __init__(self, composition=None, authors=None, name=None):
         self.composition = composition or self._create_default_composition()
         self.authors = authors or []
         self.name = name
 
+    def __reduce__(self):
+        return Edition, (self.composition, self.authors, self.name)
+
     @staticmethod
     def _create_default_composition():
         return Composition()
 
     def add_name(self, text_value):
-        self.name = text_value.strip()
+        self.name = sys.intern(text_value.strip())
 
     def add_authors(self, text_value):
         text_value = text_value.strip()
@@ -246,28 +192,26 @@ class Edition(object):
             if editor.name:
                 self.authors.append(editor)
 
-    def insert_to_db(self, db_conn, score_id, editor_ids):
-        cur = db_conn.cursor()
-
-        insert_sql = "INSERT INTO edition(score, name, year) VALUES (?, ?, null);"
-        cur.execute(insert_sql, (score_id, self.name))
-        db_conn.commit()
-        edition_id = cur.lastrowid
-
-        # store relation info into score_author table
-        for editor in editor_ids:
-            cur.execute("INSERT INTO edition_author(edition, editor) VALUES (?, ?);", (edition_id, editor))
-            db_conn.commit()
+    def content_hash(self):
+        return edition_content_hash(
+            self.composition.content_hash(), self.name, [editor.name for editor in self.authors]
+        )
 
-        return edition_id
+    def insert_to_db(self, db_conn, score_id, editor_ids):
+        return insert_edition(db_conn, score_id, self.name, self.content_hash(), editor_ids)
 
 
 class Print(object):
+    __slots__ = ("print_id", "edition", "partiture")
+
     def __init__(self, print_id, edition=None, partiture=None):
         self.print_id = print_id
         self.edition = edition or self._create_default_edition()
         self.partiture = partiture
 
+    def __reduce__(self):
+        return Print, (self.print_id, self.edition, self.partiture)
+
     @staticmethod
     def _create_default_edition():
         return Edition()
@@ -276,6 +220,12 @@ class Print(object):
         return self.edition.composition
 
     def format(self):
+        print(self.format_text())
+
+    def format_text(self):
+        """
+        :return: text printed by format(), without the final newline
+        """
         voice_prints = []
         for i, voice in enumerate(self.edition.composition.voices):
             voice_prints.append(VOICE_TEMPLATE.format(i + 1, voice))
@@ -299,7 +249,7 @@ class Print(object):
             self.edition.composition.incipit,
         )
 
-        print(to_print)
+        return to_print
 
     def set_partiture_from_text(self, text_value):
         if text_value.strip() in ("yes", "True"):
@@ -310,17 +260,7 @@ class Print(object):
             self.partiture = None
 
     def save_to_db(self, db_conn, edition_id):
-        cur = db_conn.cursor()
-        try:
-            cur.execute("INSERT INTO print(id, partiture, edition) VALUES (?, ?, ?);", (
-                self.print_id,
-                "Y" if self.partiture else "N",
-                edition_id
-            ))
-            db_conn.commit()
-
-        except IntegrityError:
-            print("INTEGRITY ERROR!")
+        insert_print(db_conn, self.print_id, self.partiture, edition_id)
 
     def my_hash(self):
         voices = "-".join([str(x) for x in self.edition.composition.voices]).replace(" ", "")
@@ -339,106 +279,811 @@ class Print(object):
         ]).replace(" ", "")
 
 
-def parse_text(pattern, line):
-    parsed_line = re.match(pattern, line)
-    if parsed_line:
-        parsed_text = parsed_line.group(2)
-        parsed_text = parsed_text.strip() if parsed_text else None
-        if parsed_text == "":
-            return None
-        return parsed_text
+def score_content_hash(name, genre, key, incipit, year, composer_names, voices):
+    """
+    Canonical hash of score content: its fields, names of composers and (range, name) of voices in order.
+    :return: hex digest stored in score.hash
+    """
+    content = (name, genre, key, incipit, year, list(composer_names), list(voices))
+    return hashlib.sha1(repr(content).encode("utf-8")).hexdigest()
+
+
+def edition_content_hash(score_hash, name, editor_names):
+    """
+    Canonical hash of edition content: hash of its score, its name and names of editors in order.
+    :return: hex digest stored in edition.hash
+    """
+    content = (score_hash, name, list(editor_names))
+    return hashlib.sha1(repr(content).encode("utf-8")).hexdigest()
+
+
+def upsert_person(db_conn, name, born, died, cache=None):
+    """
+    Insert person or fill in born and died missing in the database, values already stored win.
+    :param cache: dict of name to (id, born, died) kept for the whole import, a person found there
+        costs a statement only when it brings born or died the database does not know yet
+    :return: id of the person
+    """
+    cached = cache.get(name) if cache is not None else None
+    if cached is None:
+        upsert_sql = """INSERT INTO person(name, born, died) VALUES (?, ?, ?)
+          ON CONFLICT(name) DO UPDATE SET born = ifnull(born, excluded.born), died = ifnull(died, excluded.died)
+          RETURNING id, born, died;"""
+        cached = db_conn.execute(upsert_sql, (name, born, died)).fetchone()
+        if cache is not None:
+            cache[name] = cached
+        return cached[0]
+
+    person_id, stored_born, stored_died = cached
+    new_born = stored_born if stored_born is not None else born
+    new_died = stored_died if stored_died is not None else died
+    if new_born != stored_born or new_died != stored_died:
+        db_conn.execute("UPDATE person SET born = ?, died = ? WHERE id = ?", (new_born, new_died, person_id))
+        cache[name] = (person_id, new_born, new_died)
+    return person_id
+
+
+def insert_score(db_conn, score_hash, name, genre, key, incipit, year, composer_ids, voices):
+    """
+    Store score with its composers and (range, name) voices, unless score with the same hash is stored.
+    :return: id of the score
+    """
+    cur = db_conn.cursor()
+
+    # one lookup in unique index of score.hash
+    cur.execute("SELECT id FROM score WHERE hash = ?;", (score_hash,))
+    score = cur.fetchone()
+    if score:
+        return score[0]
+
+    try:
+        insert_sql = "INSERT INTO score(name, genre, key, incipit, year, hash) VALUES (?, ?, ?, ?, ?, ?);"
+        cur.execute(insert_sql, (name, genre, key, incipit, year, score_hash))
+        score_id = cur.lastrowid
+
+        # store relation info into score_author table
+        # the same composer twice in one score is stored once, like the unique index requires
+        cur.executemany("INSERT INTO score_author(score, composer) VALUES (?, ?);", [
+            (score_id, composer) for composer in dict.fromkeys(composer_ids)
+        ])
 
+        # store voices
+        voice_insert_sql = "INSERT INTO voice(number, score, range, name) VALUES (?, ?, ?, ?);"
+        cur.executemany(voice_insert_sql, [
+            (number + 1, score_id, voice_range, voice_name) for number, (voice_range, voice_name) in enumerate(voices)
+        ])
 
-def parse_line(line):
-    patterns = {
-        "print": re.compile("(Print Number: )(.*)"),
-        "composer": re.compile("(Composer: )(.*)"),
-        "title": re.compile("(Title: )(.*)"),
-        "genre": re.compile("(Genre: )(.*)"),
-        "key": re.compile("(Key: )(.*)"),
-        "composition_year": re.compile("(Composition Year: )(.*)"),
-        "edition": re.compile("(Edition: )(.*)"),
-        "editor": re.compile("(Editor: )(.*)"),
-        "voice": re.compile("(Voice \d: )(.*)"),
-        "partiture": re.compile("(Partiture: )(.*)"),
-        "incipit": re.compile("(Incipit: )(.*)"),
+        return score_id
+
+    except IntegrityError:
+        print("INTEGRITY ERROR!")
+
+
+def insert_edition(db_conn, score_id, name, edition_hash, editor_ids):
+    cur = db_conn.cursor()
+
+    insert_sql = "INSERT INTO edition(score, name, year, hash) VALUES (?, ?, null, ?);"
+    cur.execute(insert_sql, (score_id, name, edition_hash))
+    edition_id = cur.lastrowid
+
+    # store relation info into edition_author table
+    cur.executemany("INSERT INTO edition_author(edition, editor) VALUES (?, ?);", [
+        (edition_id, editor) for editor in editor_ids
+    ])
+
+    return edition_id
+
+
+def insert_print(db_conn, print_id, partiture, edition_id):
+    cur = db_conn.cursor()
+    row = (print_id, "Y" if partiture else "N", edition_id)
+    cur.execute("INSERT INTO print(id, partiture, edition) VALUES (?, ?, ?) ON CONFLICT(id) DO NOTHING;", row)
+    if cur.rowcount == 0:
+        # the same print imported again is fine, only a different print with the same id is an error
+        cur.execute("SELECT id, partiture, edition FROM print WHERE id = ?;", (print_id,))
+        if cur.fetchone() != row:
+            print("INTEGRITY ERROR!")
+
+
+def _parse_editor_text(text_editor):
+    """
+    :return: editor name or None
+    """
+    tmp_name, *rest = text_editor.split("(")
+    name = sys.intern(tmp_name.strip().strip("[").strip("]"))
+    return name if name.strip() != "" else None
+
+
+def _parse_composer_text(text_composer):
+    """
+    :return: (name, born, died) tuple, missing values are None
+    """
+    text_composer = text_composer.strip()
+    tmp_name, *rest = text_composer.split("(")
+    name = sys.intern(tmp_name.strip())
+    if name.strip() == "":
+        name = None
+
+    # normal range
+    parsed = FULL_RANGE_PATTERN.search(text_composer)
+    if parsed:
+        b, d = parsed.group().split("--")
+        return name, int(b), int(d)
+
+    # born start with *
+    parsed = BORN_PATTERN.search(text_composer)
+    if parsed:
+        return name, int(parsed.group()[1:6]), None
+
+    # died start with +
+    parsed = DIED_PATTERN.search(text_composer)
+    if parsed:
+        return name, None, int(parsed.group()[1:6])
+
+    parsed = DIED_RANGE_PATTERN.search(text_composer)
+    if parsed:
+        b, d = parsed.group().split("--")
+        return name, None, int(d)
+
+    parsed = BORN_RANGE_PATTERN.search(text_composer)
+    if parsed:
+        b, d = parsed.group().split("--")
+        return name, int(b), None
+
+    return name, None, None
+
+
+def _parse_voice_text(text_voice):
+    """
+    :return: (name, range) tuple, missing values are None
+    """
+    if "--" in text_voice:
+        temp_range, *temp_name = text_voice.split(",", maxsplit=1)
+        name = sys.intern(temp_name[0].strip()) if temp_name else None
+        return name, sys.intern(temp_range.strip())
+
+    text_voice = text_voice.strip()
+    if text_voice.startswith("None, "):
+        return sys.intern(text_voice.lstrip("None,").strip()), None
+    return sys.intern(text_voice), None
+
+
+def set_parse_cache_size(size):
+    """
+    Set how many distinct texts are remembered by each of composer, editor and voice parsers.
+    Parsed results are immutable tuples, so cached ones are shared safely. Counters are reset.
+    """
+    global parse_composer_text, parse_editor_text, parse_voice_text
+    parse_composer_text = functools.lru_cache(maxsize=size)(_parse_composer_text)
+    parse_editor_text = functools.lru_cache(maxsize=size)(_parse_editor_text)
+    parse_voice_text = functools.lru_cache(maxsize=size)(_parse_voice_text)
+
+
+def parse_cache_info():
+    """
+    :return: dict of hits, misses, maxsize and currsize of composer, editor and voice parse caches
+    """
+    return {
+        "composer": parse_composer_text.cache_info()._asdict(),
+        "editor": parse_editor_text.cache_info()._asdict(),
+        "voice": parse_voice_text.cache_info()._asdict(),
     }
 
+
+def parse_line(line):
+    """
+    Classify line by its label in front of first ": " with one dictionary lookup.
+    :return: (line type, stripped value) tuple, ("newline", None) for empty line,
+        None for unknown label or empty value
+    """
     if line == "\n":
-        return {
-            "type": "newline",
-            "value": None,
-        }
+        return NEWLINE
 
-    for line_type, pattern in patterns.items():
-        parsed_line = parse_text(pattern, line)
-        if parsed_line:
-            return {
-                "type": line_type,
-                "value": parsed_line,
-            }
+    label, separator, value = line.partition(": ")
+    line_type = LINE_TYPES.get(label) if separator else None
+    if line_type:
+        value = value.strip()
+        if value:
+            return line_type, value
 
 
-def load(file_path):
-    prints = []
+def compression_opener(file_path):
+    """
+    Detect compressed file by its magic bytes.
+    :return: open function of matching compression module, None for plain text file
+    """
+    with open(file_path, "rb") as file:
+        magic = file.read(6)
+    for signature, opener in COMPRESSION_OPENERS:
+        if magic.startswith(signature):
+            return opener
 
-    with open(file_path, "r") as file:
 
-        p = None
+def open_library(file_path):
+    opener = compression_opener(file_path)
+    if opener:
+        return opener(file_path, "rt")
+    return open(file_path, "r")
+
 
-        for line in file:
+def library_paths(file_path):
+    """
+    :param file_path: path or glob pattern of library file, or list of them
+    :return: list of matching paths, a pattern matching nothing is kept as it is
+    """
+    patterns = [file_path] if isinstance(file_path, str) else file_path
+    paths = []
+    for pattern in patterns:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    return paths
 
-            parsed = parse_line(line)
 
-            if not parsed:
-                continue
+def iter_load(path_or_file):
+    """
+    Yield prints one by one as soon as their record is finished by blank line or end of file,
+    so only one record is held in memory.
+    :param path_or_file: opened text file, or anything load() accepts
+    """
+    if hasattr(path_or_file, "read"):
+        yield from iter_prints(path_or_file)
+        return
+
+    for path in library_paths(path_or_file):
+        with open_library(path) as file:
+            yield from iter_prints(file)
+
+
+def iter_prints(lines):
+    """
+    Parse prints from catalog lines, every print is yielded when its record ends.
+    """
+    p = None
+
+    for line in lines:
+
+        parsed = parse_line(line)
+
+        if not parsed:
+            continue
+
+        parsed_type, parsed_value = parsed
+
+        if parsed_type == "print":
+            if p is not None:
+                yield p
+            p = Print(int(parsed_value))
 
-            parsed_type = parsed["type"]
-            parsed_value = parsed["value"]
+        if parsed_type == "composer":
+            p.edition.composition.set_composers(parsed_value)
 
-            if parsed_type == "print":
-                p = Print(int(parsed_value))
-                prints.append(p)
+        if parsed_type == "title":
+            p.edition.composition.set_name(parsed_value)
 
-            if parsed_type == "composer":
-                p.edition.composition.set_composers(parsed_value)
+        if parsed_type == "genre":
+            p.edition.composition.set_genre(parsed_value)
 
-            if parsed_type == "title":
-                p.edition.composition.set_name(parsed_value)
+        if parsed_type == "key":
+            p.edition.composition.set_key(parsed_value)
 
-            if parsed_type == "genre":
-                p.edition.composition.set_genre(parsed_value)
+        if parsed_type == "composition_year":
+            p.edition.composition.set_year(parsed_value)
 
-            if parsed_type == "key":
-                p.edition.composition.set_key(parsed_value)
+        if parsed_type == "edition":
+            p.edition.add_name(parsed_value)
 
-            if parsed_type == "composition_year":
-                p.edition.composition.set_year(parsed_value)
+        if parsed_type == "editor":
+            p.edition.add_authors(parsed_value)
 
-            if parsed_type == "edition":
-                p.edition.add_name(parsed_value)
+        if parsed_type == "voice":
+            p.edition.composition.add_voice(parsed_value)
 
-            if parsed_type == "editor":
-                p.edition.add_authors(parsed_value)
+        if parsed_type == "partiture":
+            p.set_partiture_from_text(parsed_value)
 
-            if parsed_type == "voice":
-                p.edition.composition.add_voice(parsed_value)
+        if parsed_type == "incipit":
+            p.edition.composition.set_incipit(parsed_value)
 
-            if parsed_type == "partiture":
-                p.set_partiture_from_text(parsed_value)
+        # just to be sure
+        if parsed_type == "newline":
+            if p is not None:
+                yield p
+            p = None
 
-            if parsed_type == "incipit":
-                p.edition.composition.set_incipit(parsed_value)
+    if p is not None:
+        yield p
 
-            # just to be sure
-            if parsed_type == "newline":
-                p = None
 
-        file.close()
+def load(file_path, workers=1, snapshot=False):
+    """
+    Load prints from library file. Files can be gzip, bz2 or xz compressed and file_path
+    can be a glob pattern or list of paths, prints of all files are returned in file order.
+    :param workers: number of processes parsing uncompressed files in parallel
+    :param snapshot: reuse parsed prints stored in binary snapshot next to every library file
+    """
+    if snapshot:
+        prints = []
+        for path in library_paths(file_path):
+            prints.extend(load_with_snapshot(path, workers))
+        return prints
 
+    if workers <= 1:
+        return list(iter_load(file_path))
+
+    prints = []
+    with Pool(workers) as pool:
+        for path in library_paths(file_path):
+            if compression_opener(path):
+                prints.extend(iter_load(path))
+                continue
+            chunks = [(path, start, end) for start, end in record_chunks(path, workers)]
+            for chunk_prints in pool.map(load_chunk, chunks):
+                prints.extend(chunk_prints)
+    return prints
+
+
+def build_index(file_path):
+    """
+    Write sidecar index with byte offset and length of every record of uncompressed library file.
+    Record of a print spans from its Print Number line to the next one, like in a full parse.
+    Raises OSError when the index can not be written, e.g. in read-only directory.
+    :return: number of indexed prints
+    """
+    stat = os.stat(file_path)
+    extents = record_extents(file_path)
+    write_index(file_path + INDEX_SUFFIX, stat, extents)
+    return len(extents)
+
+
+def check_indexable(file_path):
+    if compression_opener(file_path):
+        raise ValueError(
+            "%s is compressed, records of compressed library file can not be indexed, "
+            "decompress it or use load()" % file_path
+        )
+
+
+def record_extents(file_path):
+    """
+    :return: dict of print id to (offset, length) of its record
+    """
+    check_indexable(file_path)
+    encoding = locale.getpreferredencoding(False)
+    extents = {}
+
+    with open(file_path, "rb") as file:
+        offset = 0
+        current = None
+        for line in file:
+            parsed = parse_line(line.decode(encoding)) if line.startswith(b"Print Number") else None
+            if parsed and parsed[0] == "print":
+                if current:
+                    # first record wins for duplicate print numbers, like get_print of a list
+                    extents.setdefault(current[0], (current[1], offset - current[1]))
+                current = (int(parsed[1]), offset)
+            offset += len(line)
+        if current:
+            extents.setdefault(current[0], (current[1], offset - current[1]))
+    return extents
+
+
+def write_index(index_path, stat, extents):
+    with open(index_path + ".tmp", "wb") as index_file:
+        index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(extents)))
+        for print_id in sorted(extents):
+            index_file.write(INDEX_ENTRY.pack(print_id, *extents[print_id]))
+    os.replace(index_path + ".tmp", index_path)
+
+
+def index_is_current(index_path, stat):
+    try:
+        with open(index_path, "rb") as index_file:
+            header = index_file.read(INDEX_HEADER.size)
+    except FileNotFoundError:
+        return False
+    if len(header) != INDEX_HEADER.size:
+        return False
+    magic, size, mtime_ns, count = INDEX_HEADER.unpack(header)
+    return magic == INDEX_MAGIC and size == stat.st_size and mtime_ns == stat.st_mtime_ns
+
+
+def lookup_index(index_path, print_id):
+    """
+    Binary search of sorted index entries, only O(log n) entries are read.
+    :return: (offset, length) of the record, None for unknown print id
+    """
+    with open(index_path, "rb") as index_file:
+        magic, size, mtime_ns, count = INDEX_HEADER.unpack(index_file.read(INDEX_HEADER.size))
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            index_file.seek(INDEX_HEADER.size + middle * INDEX_ENTRY.size)
+            entry_id, offset, length = INDEX_ENTRY.unpack(index_file.read(INDEX_ENTRY.size))
+            if entry_id == print_id:
+                return offset, length
+            if entry_id < print_id:
+                low = middle + 1
+            else:
+                high = middle
+    return None
+
+
+def get_print(file_path, print_id):
+    """
+    Parse only the record of one print using sidecar index of the library file.
+    Index is rebuilt first if it is missing or size or mtime of the file changed. When it can not
+    be written, e.g. in read-only directory, records found by the scan are used just this once.
+    Compressed library file can not be indexed, ValueError is raised for it.
+    :return: Print or None if there is no such print
+    """
+    check_indexable(file_path)
+    index_path = file_path + INDEX_SUFFIX
+    stat = os.stat(file_path)
+    if index_is_current(index_path, stat):
+        extent = lookup_index(index_path, print_id)
+    else:
+        extents = record_extents(file_path)
+        try:
+            write_index(index_path, stat, extents)
+        except OSError:
+            pass
+        extent = extents.get(print_id)
+
+    if extent is None:
+        return None
+    offset, length = extent
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        text = file.read(length).decode(locale.getpreferredencoding(False))
+    return next(iter_prints(io.StringIO(text, newline=None)), None)
+
+
+def file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_with_snapshot(file_path, workers=1):
+    """
+    Load prints of one library file from its snapshot file, if the snapshot belongs to the current content.
+    Snapshot is trusted right away when size and mtime of the file match, if only mtime differs
+    content hash decides. Missing, stale or broken snapshot is replaced after a full parse.
+    """
+    stat = os.stat(file_path)
+    snapshot_path = file_path + SNAPSHOT_SUFFIX
+    digest = None
+
+    try:
+        with open(snapshot_path, "rb") as snapshot_file:
+            header = pickle.load(snapshot_file)
+            if header["version"] == SNAPSHOT_VERSION and header["size"] == stat.st_size:
+                if header["mtime_ns"] == stat.st_mtime_ns:
+                    return pickle.load(snapshot_file)
+                digest = file_digest(file_path)
+                if header["sha256"] == digest:
+                    prints = pickle.load(snapshot_file)
+                    save_snapshot(snapshot_path, stat, digest, prints)
+                    return prints
+    except FileNotFoundError:
+        pass
+    except Exception:
+        # anything can be raised by unpickling broken data, snapshot is just rebuilt
+        pass
+
+    digest = digest or file_digest(file_path)
+    prints = load(file_path, workers)
+    save_snapshot(snapshot_path, stat, digest, prints)
     return prints
 
 
+def save_snapshot(snapshot_path, stat, digest, prints):
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest,
+    }
+    try:
+        with open(snapshot_path + ".tmp", "wb") as snapshot_file:
+            pickle.dump(header, snapshot_file, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(prints, snapshot_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(snapshot_path + ".tmp", snapshot_path)
+    except OSError:
+        # snapshot is only a cache, read-only library directory is fine
+        pass
+
+
+def split_records(data):
+    """
+    Split content of library file into records, record of a print spans from its Print Number line
+    to the next one like in build_index, so every record parses alone as in a full parse.
+    :return: list of record bytes
+    """
+    encoding = locale.getpreferredencoding(False)
+    starts = []
+    for match in PRINT_LINE_PATTERN.finditer(data):
+        line_end = data.find(b"\n", match.start())
+        line = data[match.start():line_end if line_end != -1 else len(data)]
+        parsed = parse_line(line.decode(encoding))
+        if parsed and parsed[0] == "print":
+            starts.append(match.start())
+    return [data[start:end] for start, end in zip(starts, starts[1:] + [len(data)])]
+
+
+def parse_record(record):
+    text = record.decode(locale.getpreferredencoding(False))
+    return next(iter_prints(io.StringIO(text, newline=None)), None)
+
+
+class IncrementalLoader(object):
+    """
+    Loader of one library file that re-parses only records whose bytes changed since the previous load.
+    Content hash and print of every record are kept between loads and can be saved to state file,
+    so that also the next process starts from them.
+    """
+    def __init__(self, file_path, state_path=None):
+        self.file_path = file_path
+        self.state_path = state_path or file_path + RECORDS_SUFFIX
+        self.stat = None
+        self.records = []
+        self.saved = True
+        self.read_state()
+
+    def read_state(self):
+        try:
+            with open(self.state_path, "rb") as state_file:
+                header = pickle.load(state_file)
+                if header["version"] == SNAPSHOT_VERSION:
+                    self.records = pickle.load(state_file)
+                    self.stat = (header["size"], header["mtime_ns"])
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # broken state only means that everything is parsed again
+            self.records = []
+            self.stat = None
+
+    def prints(self):
+        return [p for digest, p in self.records if p is not None]
+
+    def load(self):
+        """
+        Prints are compared with the previous load by print number: a new number is added,
+        a missing one removed and a number with different record content changed.
+        :return: (prints, {"added": new prints, "changed": new prints, "removed": prints of the previous load})
+        """
+        stat = os.stat(self.file_path)
+        diff = {"added": [], "changed": [], "removed": []}
+        if self.stat == (stat.st_size, stat.st_mtime_ns):
+            return self.prints(), diff
+
+        reusable = defaultdict(list)
+        previous_digests = {}
+        for digest, p in reversed(self.records):
+            reusable[digest].append(p)
+            if p is not None:
+                previous_digests[p.print_id] = digest
+
+        with (compression_opener(self.file_path) or open)(self.file_path, "rb") as file:
+            data = file.read()
+
+        records = []
+        for record in split_records(data):
+            digest = hashlib.blake2b(record, digest_size=16).digest()
+            p = reusable[digest].pop() if reusable[digest] else parse_record(record)
+            records.append((digest, p))
+            if p is None:
+                continue
+            previous_digest = previous_digests.pop(p.print_id, None)
+            if previous_digest is None:
+                diff["added"].append(p)
+            elif previous_digest != digest:
+                diff["changed"].append(p)
+
+        diff["removed"] = [p for digest, p in self.records if p is not None and p.print_id in previous_digests]
+        self.records = records
+        self.stat = (stat.st_size, stat.st_mtime_ns)
+        self.saved = False
+        return self.prints(), diff
+
+    def save(self):
+        """
+        Write records to state file, if anything was loaded since it was read or saved.
+        """
+        if self.saved or self.stat is None:
+            return
+        header = {
+            "version": SNAPSHOT_VERSION,
+            "size": self.stat[0],
+            "mtime_ns": self.stat[1],
+        }
+        try:
+            with open(self.state_path + ".tmp", "wb") as state_file:
+                pickle.dump(header, state_file, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self.records, state_file, pickle.HIGHEST_PROTOCOL)
+            os.replace(self.state_path + ".tmp", self.state_path)
+            self.saved = True
+        except OSError:
+            pass
+
+
+def load_incremental(file_path, state_path=None):
+    """
+    Load prints of one library file using state file of the previous run, see IncrementalLoader.
+    :return: (prints, diff) like IncrementalLoader.load
+    """
+    loader = IncrementalLoader(file_path, state_path)
+    prints, diff = loader.load()
+    loader.save()
+    return prints, diff
+
+
+def record_chunks(file_path, parts):
+    """
+    Split file into at most `parts` byte ranges of similar size. Every range but the first one
+    starts right after a blank line, where parser state is the same as at the start of a file,
+    so parsing ranges separately gives the same prints as parsing the whole file.
+    """
+    with open(file_path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            boundaries = [0]
+            for part in range(1, parts):
+                position = mm.find(b"\n\n", max(size * part // parts - 2, boundaries[-1]))
+                if position == -1:
+                    break
+                boundaries.append(position + 2)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def load_chunk(chunk):
+    file_path, start, end = chunk
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode(locale.getpreferredencoding(False))
+    return list(iter_prints(io.StringIO(text, newline=None)))
+
+
+def render_composer(composer):
+    if composer.born and composer.died:
+        return "%s (%d--%d)" % (composer.name, composer.born, composer.died)
+    if composer.born:
+        return "%s (*%d)" % (composer.name, composer.born)
+    if composer.died:
+        return "%s (+%d)" % (composer.name, composer.died)
+    return composer.name
+
+
+def render_editors(editors):
+    """
+    Join editor names so that Edition.add_authors splits them back to the same names.
+    Two names that can not be paired by comma use the ", continuo by" separator.
+    """
+    names = [editor.name for editor in editors]
+    if len(names) == 2 and not all(" " in name and "," not in name for name in names):
+        return "%s, continuo by %s" % tuple(names)
+    return ", ".join(names)
+
+
+def render_voice(voice):
+    if voice.range is not None:
+        return "%s, %s" % (voice.range, voice.name) if voice.name is not None else voice.range
+    if voice.name.startswith("None, "):
+        return "None, " + voice.name
+    return voice.name
+
+
+def render_print(p):
+    """
+    Render print as a catalog record followed by blank line, load() parses it back to equal print.
+    """
+    composition = p.edition.composition
+    lines = [
+        "Print Number: %d" % p.print_id,
+        "Composer: " + "; ".join(render_composer(composer) for composer in composition.authors),
+        "Title: " + (composition.name or ""),
+        "Genre: " + (composition.genre or ""),
+        "Key: " + (composition.key or ""),
+        "Composition Year: " + (composition.year or ""),
+        "Edition: " + (p.edition.name or ""),
+        "Editor: " + render_editors(p.edition.authors),
+    ]
+    lines.extend("Voice %d: %s" % (number, render_voice(voice)) for number, voice in enumerate(composition.voices, 1))
+    lines.append("Partiture: " + PARTITURE_TEXTS[p.partiture])
+    lines.append("Incipit: " + (composition.incipit or ""))
+    lines.append("\n")
+    return "\n".join(lines)
+
+
+def render_formatted(p):
+    """
+    Render print exactly as Print.format() prints it.
+    """
+    return p.format_text() + "\n"
+
+
+def dump(prints, file, buffer_size=None, render=render_print):
+    """
+    Write prints in the catalog format, the inverse of load(). Records are rendered
+    into a buffer that is written in blocks of about buffer_size characters.
+    :param render: function rendering one print, e.g. render_formatted for output of Print.format()
+    """
+    buffer_size = buffer_size or DUMP_BUFFER_SIZE
+    buffer = []
+    buffered = 0
+    for p in prints:
+        record = render(p)
+        buffer.append(record)
+        buffered += len(record)
+        if buffered >= buffer_size:
+            file.write("".join(buffer))
+            buffer = []
+            buffered = 0
+    file.write("".join(buffer))
+
+
+def timed(function, name, stats):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            entry = stats[name]
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+    return wrapper
+
+
+def timed_classifier(classifier, stats):
+    @functools.wraps(classifier)
+    def wrapper(line):
+        start = time.perf_counter()
+        parsed = classifier(line)
+        entry = stats["parse_line " + (parsed[0] if parsed else "skipped")]
+        entry[0] += 1
+        entry[1] += time.perf_counter() - start
+        return parsed
+    return wrapper
+
+
+@contextlib.contextmanager
+def profile_load():
+    """
+    Count calls and time of line classification (per field type) and of the setters used by the loader
+    while inside the block. Methods are wrapped only for the block, so there is no cost otherwise.
+    Times are inclusive, e.g. set_composers contains Composer.create_from_text.
+    Only parsing in this process is profiled, not load() workers.
+    :return: dict of name to [calls, seconds], filled when the block ends
+    """
+    global parse_line
+    stats = defaultdict(lambda: [0, 0.0])
+    originals = [(cls, name, cls.__dict__[name]) for cls, name in PROFILED_METHODS]
+    original_parse_line = parse_line
+
+    for cls, name, method in originals:
+        setattr(cls, name, timed(method, "%s.%s" % (cls.__name__, name), stats))
+    parse_line = timed_classifier(original_parse_line, stats)
+    try:
+        yield stats
+    finally:
+        parse_line = original_parse_line
+        for cls, name, method in originals:
+            setattr(cls, name, method)
+
+
+def format_profile(stats):
+    lines = ["%-40s %10s %12s %10s" % ("", "calls", "total ms", "us/call")]
+    for name, (calls, seconds) in sorted(stats.items(), key=lambda item: -item[1][1]):
+        lines.append("%-40s %10d %12.1f %10.2f" % (name, calls, seconds * 1e3, seconds * 1e6 / calls))
+    return "\n".join(lines)
+
+
 PRINT_TEMPLATE = """Print Number: {0}
 Composer: {1}
 Title: {2}
@@ -452,3 +1097,79 @@ Incipit: {10}
 """
 
 VOICE_TEMPLATE = """Voice {0}: {1}"""
+
+PROFILED_METHODS = [
+    (Print, "__init__"),
+    (Print, "set_partiture_from_text"),
+    (Composition, "set_composers"),
+    (Composition, "set_name"),
+    (Composition, "set_genre"),
+    (Composition, "set_key"),
+    (Composition, "set_year"),
+    (Composition, "set_incipit"),
+    (Composition, "add_voice"),
+    (Edition, "add_name"),
+    (Edition, "add_authors"),
+    (Composer, "create_from_text"),
+    (Editor, "create_from_text"),
+    (Voice, "create_from_text"),
+]
+
+PARTITURE_TEXTS = {True: "yes", False: "no", None: ""}
+
+DUMP_BUFFER_SIZE = 1024 * 1024
+
+FULL_RANGE_PATTERN = re.compile(r"(\d\d\d\d--\d\d\d\d)")
+
+BORN_PATTERN = re.compile(r"\*\d\d\d\d")
+
+DIED_PATTERN = re.compile(r"\+\d\d\d\d")
+
+DIED_RANGE_PATTERN = re.compile(r"(--\d\d\d\d)")
+
+BORN_RANGE_PATTERN = re.compile(r"(\d\d\d\d--)")
+
+PARSE_CACHE_SIZE = 4096
+
+set_parse_cache_size(PARSE_CACHE_SIZE)
+
+LINE_TYPES = {
+    "Print Number": "print",
+    "Composer": "composer",
+    "Title": "title",
+    "Genre": "genre",
+    "Key": "key",
+    "Composition Year": "composition_year",
+    "Edition": "edition",
+    "Editor": "editor",
+    "Partiture": "partiture",
+    "Incipit": "incipit",
+}
+LINE_TYPES.update(("Voice %d" % number, "voice") for number in range(10))
+
+NEWLINE = ("newline", None)
+
+INDEX_SUFFIX = ".index"
+
+INDEX_MAGIC = b"SCIDX001"
+
+# magic, file size, file mtime in ns, number of entries
+INDEX_HEADER = struct.Struct("<8sqqq")
+
+# print id, record offset, record length
+INDEX_ENTRY = struct.Struct("<qqq")
+
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# bump when parsed objects change, so that old snapshots and record states are not used
+SNAPSHOT_VERSION = 1
+
+RECORDS_SUFFIX = ".records"
+
+PRINT_LINE_PATTERN = re.compile(rb"^Print Number: ", re.MULTILINE)
+
+COMPRESSION_OPENERS = [
+    (b"\x1f\x8b", gzip.open),
+    (b"BZh", bz2.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+]
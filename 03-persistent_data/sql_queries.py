@@ -10,7 +10,8 @@ CREATE_EMPTY_DB = [
                      genre varchar,
                      key varchar,
                      incipit varchar,
-                     year integer);""",
+                     year integer,
+                     hash varchar);""",
     """create table voice ( id integer primary key not null,
                      number integer not null,
                      score integer references score( id ) not null,
@@ -19,7 +20,8 @@ CREATE_EMPTY_DB = [
     """create table edition ( id integer primary key not null,
                        score integer references score( id ) not null,
                        name varchar,
-                       year integer );""",
+                       year integer,
+                       hash varchar );""",
     """create table score_author( id integer primary key not null,
                            score integer references score( id ) not null,
                            composer integer references person( id ) not null );""",
@@ -37,4 +39,6 @@ DEFINED_CONSTRAINTS = [
     """CREATE UNIQUE INDEX score_author_unique_index ON score_author(score, composer);""",
     """CREATE UNIQUE INDEX voice_unique_index ON voice(number, score, ifnull(range, ''), ifnull(name, ''));""",
     """CREATE UNIQUE INDEX print_unique_index ON print(id);""",
+    """CREATE UNIQUE INDEX score_hash_unique_index ON score(hash);""",
+    """CREATE UNIQUE INDEX edition_hash_unique_index ON edition(hash);""",
 ]
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from generate_catalog import generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAT_SCRIPT = os.path.join(ROOT, "01-text_re", "stat.py")
+
+SCORELIB_DIR = os.path.join(ROOT, "02-objects_classes")
+
+STAT_MODES = ["composer", "century", "cminor", "all"]
+
+LOAD_CODE = "import sys; sys.path.insert(0, sys.argv[1]); import scorelib; scorelib.load(sys.argv[2])"
+
+
+def run_measured(command):
+    """
+    Run command with output thrown away.
+    :return: (wall time in seconds, peak RSS of the process in kB)
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return elapsed, usage.ru_maxrss
+
+
+def catalog_path(data_dir, records, seed):
+    file_path = os.path.join(data_dir, "catalog_%d_%d.txt" % (records, seed))
+    if not os.path.exists(file_path):
+        generate(file_path + ".tmp", records, seed)
+        os.replace(file_path + ".tmp", file_path)
+    return file_path
+
+
+def benchmark_targets(file_path, jobs):
+    targets = []
+    for mode in STAT_MODES:
+        command = [sys.executable, STAT_SCRIPT, file_path, mode]
+        if jobs > 1:
+            command += ["--jobs", str(jobs)]
+        targets.append(("stat.py " + mode, command))
+    targets.append(("scorelib.load", [sys.executable, "-c", LOAD_CODE, SCORELIB_DIR, file_path]))
+    return targets
+
+
+def run_benchmarks(sizes, data_dir, seed=0, repeat=3, jobs=1):
+    results = []
+    for records in sizes:
+        file_path = catalog_path(data_dir, records, seed)
+        size = os.path.getsize(file_path)
+        for name, command in benchmark_targets(file_path, jobs):
+            # the best of repeated runs is least disturbed by other load on the machine
+            seconds, peak_rss = min(run_measured(command) for _ in range(repeat))
+            results.append({
+                "target": name,
+                "records": records,
+                "bytes": size,
+                "jobs": jobs,
+                "seconds": round(seconds, 4),
+                "records_per_second": round(records / seconds),
+                "mb_per_second": round(size / seconds / 1e6, 2),
+                "peak_rss_kb": peak_rss,
+            })
+            print("%s, %d records: %.2f s" % (name, records, seconds), file=sys.stderr)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark stat.py modes and scorelib.load on synthetic catalogs.")
+    parser.add_argument("sizes", nargs="*", type=int, default=[10000, 100000], help="numbers of records")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"),
+                        help="directory for generated catalogs, they are reused by later runs")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of generated catalogs")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every target, the best one is reported")
+    parser.add_argument("--jobs", type=int, default=1, help="--jobs passed to stat.py")
+    parser.add_argument("--output", help="JSON output file, standard output by default")
+    args = parser.parse_args()
+
+    os.makedirs(args.data, exist_ok=True)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": run_benchmarks(args.sizes, args.data, args.seed, args.repeat, args.jobs),
+    }
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=4, ensure_ascii=False)
+    else:
+        json.dump(report, sys.stdout, indent=4, ensure_ascii=False)
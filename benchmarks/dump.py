@@ -0,0 +1,49 @@
+import contextlib
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, "02-objects_classes"))
+
+import scorelib  # noqa: E402
+from round_trip import check_round_trip  # noqa: E402
+
+
+def time_format(prints, output):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        for p in prints:
+            p.format()
+    return time.perf_counter() - start
+
+
+def time_dump(prints, output, render=scorelib.render_print):
+    start = time.perf_counter()
+    scorelib.dump(prints, output, render=render)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        sys.exit("Optional argument should be path to library file!")
+
+    file_path = sys.argv[1] if len(sys.argv) == 2 else os.path.join(ROOT, "02-objects_classes", "scorelib.txt")
+    prints = scorelib.load(file_path)
+
+    mismatches = check_round_trip(prints)
+    if mismatches:
+        sys.exit("Round trip failed for %d prints!" % mismatches)
+
+    with open(os.devnull, "w") as output:
+        format_seconds = min(time_format(prints, output) for _ in range(3))
+        dump_seconds = min(time_dump(prints, output) for _ in range(3))
+        formatted_seconds = min(time_dump(prints, output, scorelib.render_formatted) for _ in range(3))
+
+    print("%d prints, round trip ok" % len(prints))
+    print("Print.format(): %.0f prints/s" % (len(prints) / format_seconds))
+    print("dump(): %.0f prints/s" % (len(prints) / dump_seconds))
+    print("speedup: %.1fx" % (format_seconds / dump_seconds))
+    print("dump() of Print.format() text, as test.py: %.0f prints/s, speedup %.1fx" % (
+        len(prints) / formatted_seconds, format_seconds / formatted_seconds))
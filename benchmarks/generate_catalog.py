@@ -0,0 +1,169 @@
+import random
+import sys
+
+COMPOSERS = [
+    ("Bach, Johann Sebastian", 1685, 1750),
+    ("Telemann, Georg Philipp", 1681, 1767),
+    ("Vivaldi, Antonio", 1678, 1741),
+    ("Händel, Georg Friedrich", 1685, 1759),
+    ("Mozart, Wolfgang Amadeus", 1756, 1791),
+    ("Haydn, Joseph", 1732, 1809),
+    ("Couperin, François", 1668, 1733),
+    ("Quantz, Johann Joachim", 1697, 1773),
+    ("Lully, Jean Baptiste", 1632, 1687),
+    ("Zelenka, Jan Dismas", 1679, 1745),
+    ("Boismortier, Joseph Bodin de", 1689, 1755),
+    ("Fasch, Johann Friedrich", 1688, 1758),
+    ("Bach, Carl Philipp Emanuel", 1714, 1788),
+    ("Bach, Johann Christian", 1735, 1782),
+    ("Pepusch, Johann Christoph", 1667, 1752),
+    ("Platti, Giovanni Benedetto", 1697, 1763),
+    ("Koželuh, Antonín", 1738, 1814),
+    ("Weber, Carl Maria", 1786, 1826),
+    ("Donizetti, Gaetano", 1797, 1848),
+    ("Verdi, Giuseppe", 1813, 1901),
+    ("Strauss, Richard", 1864, 1949),
+    ("Elgar, Edward", 1857, 1934),
+    ("Dvarionas, B.", 1904, 1972),
+    ("Мясковский, Николай", 1881, 1950),
+    ("Глинка, Михаил", 1804, 1857),
+]
+
+# popularity of composers in the real catalog falls roughly with 1 / rank
+COMPOSER_WEIGHTS = [1 / rank for rank in range(1, len(COMPOSERS) + 1)]
+
+ANONYMOUS = ["Anonymous", "Anonym", "Various", "Unknown"]
+
+# pairs written as "first/second", like "Hinkel, Volker/Freudenthaler, Peter" in the real catalog,
+# the parsers split a composer line on "/" only when it contains "r/F"
+SLASH_PAIRS = [
+    ("Hinkel, Volker", "Freudenthaler, Peter"),
+    ("Kiefer, Walter", "Fischer, Johann Caspar"),
+    ("Schober, Lothar", "Frank, Michael"),
+    ("Bauer, Alexander", "Fuchs, Robert"),
+]
+
+TITLES = ["Sonata", "Concerto", "Trio Sonata", "Suite", "Triosonate", "Partita", "Cantata", "Fantasia", "Quartetto"]
+
+GENRES = [
+    "orchestra", "harpsichord", "piano", "oboe and continuo", "oboe concerto", "oboe and piano",
+    "cantate", "treble and continuo", "solo concerto", "triosonata, 2 traverso & continuo", "bassoon & piano",
+]
+
+KEYS = ["C", "g", "G", "d", "F", "D", "Bes", "a", "e", "Es", "c minor", "A"]
+
+EDITIONS = [
+    "facsimile", "modern", "manuscript", "Musica Rara", "lilypond", "Barenreiter", "Bärenreiter Verlag",
+    "Breitkopf & Härtel", "B. Schott's Söhne", "Henle Verlag, München",
+    "Государственное музыкальное издательство, Москва", "Музыка, Ленинград",
+]
+
+EDITORS = [
+    "Markus Müller", "David Lasocki", "Hugo Ruf", "Hana Zelníčková", "David Lasocki, R. P. Block",
+    "Daniel, Ladislav", "Bernhard Päuler, Klaus Hofmann", "Böhmová, Z., Grünfeldová, A.",
+    "Зверев, В., Костлан, И.", "Günter Graulich", "Max Seiffert, continuo by Hugo Ruf",
+]
+
+INSTRUMENTS = ["oboe", "bassoon", "violin", "flute", "cello", "treble", "harpsichord", "viola"]
+
+RANGES = ["Bes1--d2", "B1--c2", "C--c2", "c1--c3", "D--g1", "g--d3", "c1--f3", "d1--a3"]
+
+NOTES = ["c4", "d8", "e8", "f'2", "c8.", "a16", "g4", "r8", "bes8", "d'4"]
+
+
+def composer_text(rnd):
+    name, born, died = rnd.choices(COMPOSERS, COMPOSER_WEIGHTS)[0]
+    form = rnd.random()
+    if form < 0.45:
+        return "%s (%d--%d)" % (name, born, died)
+    if form < 0.55:
+        return "%s (*%d)" % (name, born)
+    if form < 0.6:
+        return "%s (+%d)" % (name, died)
+    return name
+
+
+def composer_line(rnd):
+    form = rnd.random()
+    if form < 0.02:
+        return ""
+    if form < 0.06:
+        return rnd.choice(ANONYMOUS)
+    if form < 0.14:
+        return "; ".join(composer_text(rnd) for _ in range(rnd.randint(2, 4)))
+    if form < 0.16:
+        return "%s & %s" % (composer_text(rnd), composer_text(rnd))
+    if form < 0.17:
+        return "%s/%s" % rnd.choice(SLASH_PAIRS)
+    return composer_text(rnd)
+
+
+def year_line(rnd):
+    form = rnd.random()
+    if form < 0.75:
+        return ""
+    if form < 0.93:
+        return str(rnd.randint(1550, 2010))
+    if form < 0.96:
+        return "ca. %d" % rnd.randint(1600, 1900)
+    if form < 0.98:
+        return "%dth century" % rnd.randint(16, 20)
+    return "%d. %d. %d" % (rnd.randint(1, 28), rnd.randint(1, 12), rnd.randint(1700, 1900))
+
+
+def voice_text(rnd):
+    instrument = rnd.choice(INSTRUMENTS)
+    form = rnd.random()
+    if form < 0.5:
+        return "%s, %s, part" % (rnd.choice(RANGES), instrument)
+    if form < 0.6:
+        return rnd.choice(RANGES)
+    return "%s, part" % instrument
+
+
+def record(rnd, print_id):
+    key = rnd.choice(KEYS) if rnd.random() < 0.7 else ""
+    title = "%s %d" % (rnd.choice(TITLES), rnd.randint(1, 12))
+    if rnd.random() < 0.01:
+        title += " c minor"
+    lines = [
+        "Print Number: %d" % print_id,
+        "Composer: %s" % composer_line(rnd),
+        "Title: %s" % title,
+        "Genre: %s" % (rnd.choice(GENRES) if rnd.random() < 0.88 else ""),
+        "Key: %s" % key,
+        "Composition Year: %s" % year_line(rnd),
+        "Publication Year: %s" % (rnd.randint(1900, 2010) if rnd.random() < 0.3 else ""),
+        "Edition: %s" % (rnd.choice(EDITIONS) if rnd.random() < 0.55 else ""),
+        "Editor: %s" % (rnd.choice(EDITORS) if rnd.random() < 0.2 else ""),
+    ]
+    for number in range(1, rnd.choice([1, 1, 2, 2, 2, 3, 4, 5]) + 1):
+        lines.append("Voice %d: %s" % (number, voice_text(rnd)))
+    lines.append("Partiture: %s" % rnd.choice(["yes", "no", "", "yes (incomplete)"]))
+    lines.append("Incipit: %s" % (
+        "treble 2/4 " + " ".join(rnd.choice(NOTES) for _ in range(4)) + " |" if rnd.random() < 0.2 else ""))
+    # many lines of the real catalog end with a trailing space
+    return "\n".join(line + " " if rnd.random() < 0.4 else line for line in lines) + "\n\n"
+
+
+def generate(file_path, records, seed=0):
+    """
+    Write synthetic catalog with `records` prints in the format and field mix of scorelib.txt.
+    Same seed always gives the same file.
+    """
+    rnd = random.Random(seed)
+    with open(file_path, "w") as file:
+        batch = []
+        for print_id in range(records):
+            batch.append(record(rnd, print_id))
+            if len(batch) == 10000:
+                file.write("".join(batch))
+                batch = []
+        file.write("".join(batch))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        sys.exit("First argument should be output path, second number of records, optional third random seed")
+
+    generate(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) == 4 else 0)
@@ -0,0 +1,51 @@
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, "03-persistent_data"))
+
+importer = importlib.import_module("import")  # noqa: E402
+
+# name, keyword arguments of fill_database_with_data
+MODES = [
+    ("commit per print", {}),
+    ("batches of 1000", {"batch_size": 1000}),
+    ("batches of 1000, WAL, synchronous=NORMAL", {"batch_size": 1000, "wal": True, "synchronous": "NORMAL"}),
+    ("one transaction, synchronous=OFF", {"batch_size": 10 ** 9, "synchronous": "OFF"}),
+    ("pipeline of 2 parsing workers, batches of 1000", {"batch_size": 1000, "workers": 2}),
+]
+
+
+def time_import(file_path, directory, options):
+    """
+    :return: (number of prints, seconds) of import into new database
+    """
+    db_path = os.path.join(directory, "scorelib.dat")
+    for suffix in ("", "-wal", "-shm"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(db_path + suffix)
+    with contextlib.redirect_stdout(io.StringIO()):
+        importer.init_database(db_path)
+    start = time.perf_counter()
+    count = importer.fill_database_with_data(db_path, file_path, **options)
+    return count, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure prints per second of import.py modes.")
+    parser.add_argument("path", nargs="?", default=os.path.join(ROOT, "03-persistent_data", "scorelib.txt"),
+                        help="library file")
+    parser.add_argument("--dir", help="directory for databases, on the storage to measure, temporary by default")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for name, options in MODES:
+            count, seconds = time_import(args.path, directory, options)
+            print("%s: %d prints, %.2f s, %.0f prints/s" % (name, count, seconds, count / seconds))
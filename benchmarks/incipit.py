@@ -0,0 +1,70 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, "02-objects_classes"))
+
+import scorelib  # noqa: E402
+from catalog import IncipitIndex, incipit_ngrams  # noqa: E402
+
+
+def brute_force(index, incipit, k):
+    """
+    Jaccard similarity of the query with every indexed incipit.
+    :return: top k like IncipitIndex.similar
+    """
+    query = incipit_ngrams(incipit, index.n)
+    scored = []
+    for incipit_id, other in enumerate(index.incipits):
+        grams = incipit_ngrams(other, index.n)
+        shared = len(query & grams)
+        if shared:
+            scored.append((shared / len(query | grams), -incipit_id))
+    scored.sort(reverse=True)
+    return [(similarity, index.incipits[-incipit_id], index.keys[-incipit_id]) for similarity, incipit_id in scored[:k]]
+
+
+def time_queries(query, incipits, k):
+    start = time.perf_counter()
+    for incipit in incipits:
+        query(incipit, k)
+    return (time.perf_counter() - start) / len(incipits)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and time incipit similarity queries.")
+    parser.add_argument("path", nargs="?", default=os.path.join(ROOT, "02-objects_classes", "scorelib.txt"),
+                        help="library file")
+    parser.add_argument("--db", help="SQLite database made by 03-persistent_data/import.py, indexed instead")
+    parser.add_argument("-k", type=int, default=10, help="number of returned incipits")
+    parser.add_argument("--queries", type=int, default=50, help="number of indexed incipits used as queries")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.db:
+        with sqlite3.connect(args.db) as db_conn:
+            index = IncipitIndex.from_db(db_conn)
+    else:
+        index = IncipitIndex.from_prints(scorelib.iter_load(args.path))
+    build_seconds = time.perf_counter() - start
+
+    queries = index.incipits[::max(1, len(index) // args.queries)][:args.queries]
+    for incipit in queries:
+        if index.similar(incipit, args.k) != brute_force(index, incipit, args.k):
+            sys.exit("Index and brute force disagree for %r!" % incipit)
+        if index.similar(incipit, 1, "tfidf")[0][1] != incipit:
+            sys.exit("Incipit is not the most similar to itself by tf-idf: %r!" % incipit)
+
+    index_seconds = time_queries(index.similar, queries, args.k)
+    tfidf_seconds = time_queries(lambda incipit, k: index.similar(incipit, k, "tfidf"), queries, args.k)
+    brute_seconds = time_queries(lambda incipit, k: brute_force(index, incipit, k), queries, args.k)
+
+    print("%d distinct incipits, %d grams, index built in %.2f s" % (len(index), len(index.postings), build_seconds))
+    print("jaccard: %.3f ms per query" % (index_seconds * 1e3))
+    print("tf-idf: %.3f ms per query" % (tfidf_seconds * 1e3))
+    print("brute force: %.3f ms per query" % (brute_seconds * 1e3))
+    print("speedup: %.1fx" % (brute_seconds / index_seconds))
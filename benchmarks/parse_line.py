@@ -0,0 +1,63 @@
+import os
+import re
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, "02-objects_classes"))
+
+import scorelib  # noqa: E402
+
+
+def regex_parse_line(line):
+    """
+    Original classifier: all patterns compiled for every line and tried one after another.
+    """
+    patterns = {
+        "print": re.compile("(Print Number: )(.*)"),
+        "composer": re.compile("(Composer: )(.*)"),
+        "title": re.compile("(Title: )(.*)"),
+        "genre": re.compile("(Genre: )(.*)"),
+        "key": re.compile("(Key: )(.*)"),
+        "composition_year": re.compile("(Composition Year: )(.*)"),
+        "edition": re.compile("(Edition: )(.*)"),
+        "editor": re.compile("(Editor: )(.*)"),
+        "voice": re.compile(r"(Voice \d: )(.*)"),
+        "partiture": re.compile("(Partiture: )(.*)"),
+        "incipit": re.compile("(Incipit: )(.*)"),
+    }
+
+    if line == "\n":
+        return "newline", None
+
+    for line_type, pattern in patterns.items():
+        parsed_line = re.match(pattern, line)
+        if parsed_line:
+            parsed_text = parsed_line.group(2).strip()
+            if parsed_text:
+                return line_type, parsed_text
+
+
+def per_line_ns(parse, lines, repeat):
+    best = min(timeit.repeat(lambda: [parse(line) for line in lines], number=1, repeat=repeat))
+    return best / len(lines) * 1e9
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        sys.exit("Optional argument should be path to library file!")
+
+    file_path = sys.argv[1] if len(sys.argv) == 2 else os.path.join(ROOT, "02-objects_classes", "scorelib.txt")
+    with open(file_path, "r") as file:
+        lines = file.readlines()
+
+    if [regex_parse_line(line) for line in lines] != [scorelib.parse_line(line) for line in lines]:
+        sys.exit("Classifiers disagree!")
+
+    regex_ns = per_line_ns(regex_parse_line, lines, 5)
+    lookup_ns = per_line_ns(scorelib.parse_line, lines, 5)
+    print("%d lines" % len(lines))
+    print("regex classifier: %.0f ns per line" % regex_ns)
+    print("label lookup classifier: %.0f ns per line" % lookup_ns)
+    print("speedup: %.1fx" % (regex_ns / lookup_ns))
@@ -0,0 +1,33 @@
+import argparse
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bytes_per_print(scorelib, file_path):
+    """
+    :return: (number of prints, bytes allocated by load() and still alive per loaded print)
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    prints = scorelib.load(file_path)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(prints), (after - before) / len(prints)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure memory of prints loaded by scorelib.load.")
+    parser.add_argument("path", nargs="?", default=os.path.join(ROOT, "02-objects_classes", "scorelib.txt"),
+                        help="library file")
+    parser.add_argument("--scorelib", default=os.path.join(ROOT, "02-objects_classes"),
+                        help="directory with scorelib.py to measure, e.g. a checkout of an older revision")
+    args = parser.parse_args()
+
+    sys.path.insert(0, args.scorelib)
+    import scorelib
+
+    count, per_print = bytes_per_print(scorelib, args.path)
+    print("%d prints, %.0f bytes per print" % (count, per_print))